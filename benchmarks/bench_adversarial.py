@@ -0,0 +1,185 @@
+"""
+Parse generated adversarial manifests of growing size and check that the parse time grows linearly with the size,
+then parse large ones with a time budget and check that they are skipped soon after the budget is spent.
+
+Usage: python benchmarks/bench_adversarial.py [--no-numpy]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from puppet_tools import parser, scanner  # noqa: E402
+from puppet_tools.main import process_file  # noqa: E402
+from puppet_tools.utility import ParseError, BudgetError, clear_logs  # noqa: E402
+
+SIZES = [1, 2, 4, 8]
+# Time per byte of the largest input may be this many times that of the smallest before it's reported superlinear
+LINEAR_MARGIN = 2.5
+# Time budget in seconds of the budget inputs, the deadline is checked between steps and one step over a long line,
+# like hashing, decoding or matching a regular expression, isn't interrupted. A skipped file may take this much more.
+BUDGET = 0.05
+BUDGET_OVERSHOOT = 0.5
+
+
+def nested_classes(n):
+    return "".join("class c%d {\n" % i for i in range(n)) + "}\n" * n
+
+
+def nested_hashes(n):
+    return "class c {\n  file { 'f':\n    content => " + "{ 'k' => " * n + "1" + " }" * n + ",\n  }\n}\n"
+
+
+def nested_cases(n):
+    return "class c {\n" + "case $x {\n  'a': {\n" * n + "}\n}\n" * n + "}\n"
+
+
+def unterminated_strings(n):
+    return "class c {\n" + "  $v = 'unterminated\n" * n + "}\n"
+
+
+def escaped_quotes(n):
+    return "class c {\n  $v = \"" + "\\\"" * n + "\n}\n"
+
+
+def long_line(n):
+    return "class c {\n  " + "x" * n + "\n}\n"
+
+
+def long_comment(n):
+    return "class c {\n  # " + "{ ' \" " * n + "\n}\n"
+
+
+def long_resource_line(n):
+    return "class c {\n  file { 'f': " + "ensure => file, " * n + "}\n}\n"
+
+
+def many_braces(n):
+    return "class c {\n  " + "{" * n + "}" * n + "\n}\n"
+
+
+def unbalanced_braces(n):
+    return "class c {\n" + "  {\n" * n
+
+
+def many_resources(n):
+    return "class c {\n" + "".join("  file { '/f%d':\n    ensure => file,\n  }\n" % i for i in range(n)) + "}\n"
+
+
+def huge_resource(n):
+    return "class c {\n  file { 'f':\n" + "    ensure => file,\n" * n + "  }\n}\n"
+
+
+# name: (generator, n of the smallest input)
+CORPUS = {
+    "nested classes": (nested_classes, 200),
+    "nested hashes": (nested_hashes, 5000),
+    "nested cases": (nested_cases, 100),
+    "unterminated strings": (unterminated_strings, 5000),
+    "escaped quotes": (escaped_quotes, 50000),
+    "megabyte line": (long_line, 125000),
+    "megabyte comment": (long_comment, 25000),
+    "long resource line": (long_resource_line, 5000),
+    "many braces": (many_braces, 50000),
+    "unbalanced braces": (unbalanced_braces, 50000),
+    "many resources": (many_resources, 2500),
+}
+
+# name: (generator, n), parsed once without and once with the budget
+BUDGET_CORPUS = {
+    "megabyte line": (long_line, 8000000),
+    "megabyte comment": (long_comment, 1000000),
+    "long resource line": (long_resource_line, 500000),
+    "huge resource": (huge_resource, 500000),
+}
+
+
+def parse_time(content):
+    start = time.perf_counter()
+    try:
+        process_file("adversarial.pp", content)
+    except ParseError:
+        pass
+    elapsed = time.perf_counter() - start
+    clear_logs()
+    return elapsed
+
+
+def budget_time(content, budget):
+    """
+    Returns the parse time and whether the file was skipped for going over the budget.
+    """
+    parser.set_max_parse_time(budget)
+    start = time.perf_counter()
+    skipped = False
+    try:
+        process_file("adversarial.pp", content)
+    except BudgetError:
+        skipped = True
+    except ParseError:
+        pass
+    elapsed = time.perf_counter() - start
+    parser.set_max_parse_time(0)
+    clear_logs()
+    return elapsed, skipped
+
+
+def check_budgets():
+    """
+    Names of the inputs that take longer than the budget but are not skipped within the budget and the overshoot.
+    """
+    print("%-24s %9s %12s %12s %s" % ("input", "size", "no budget", "budget", "result"))
+    over_budget = []
+    for name, (generator, n) in BUDGET_CORPUS.items():
+        content = generator(n)
+        unlimited, _ = budget_time(content, 0)
+        limited, skipped = budget_time(content, BUDGET)
+        if unlimited <= BUDGET:
+            result = "within the budget"
+        elif skipped and limited <= BUDGET + BUDGET_OVERSHOOT:
+            result = "skipped"
+        else:
+            result = "skipped too late" if skipped else "not skipped"
+            over_budget.append(name)
+        print("%-24s %8dK %10.0fms %10.0fms %s" % (name, len(content) // 1024, unlimited * 1000, limited * 1000,
+                                                     result))
+    return over_budget
+
+
+def main():
+    if "--no-numpy" in sys.argv:
+        scanner.set_use_numpy(False)
+    parser.set_max_depth(1000000)
+
+    print("%-24s %s %10s" % ("input", " ".join("%14s" % ("x%d" % s) for s in SIZES), "growth"))
+    superlinear = []
+    for name, (generator, n) in CORPUS.items():
+        results = []
+        for size in SIZES:
+            content = generator(n * size)
+            results.append((len(content), parse_time(content)))
+
+        per_byte = [seconds / length for length, seconds in results]
+        growth = per_byte[-1] / per_byte[0]
+        if growth > LINEAR_MARGIN:
+            superlinear.append(name)
+        print("%-24s %s %9.2fx" % (name, " ".join("%7dK %5.0fms" % (length // 1024, seconds * 1000)
+                                                   for length, seconds in results), growth))
+
+    print()
+    over_budget = check_budgets()
+
+    print()
+    if superlinear:
+        print("Superlinear parse time: " + ", ".join(superlinear))
+    if over_budget:
+        print("Not skipped within %g seconds of the %g seconds budget: %s" % (BUDGET_OVERSHOOT, BUDGET,
+                                                                              ", ".join(over_budget)))
+    if superlinear or over_budget:
+        exit(1)
+    print("Parse time grows linearly for all inputs and the budget skips the large ones")
+
+
+if __name__ == "__main__":
+    main()
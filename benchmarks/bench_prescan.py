@@ -0,0 +1,74 @@
+"""
+Compare the pure Python prescan with the NumPy prescan on generated manifests, or on the .pp files of a module.
+
+Usage: python benchmarks/bench_prescan.py [module_directory]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from puppet_tools import scanner  # noqa: E402
+from puppet_tools.utility import get_all_files  # noqa: E402
+
+RESOURCE = """  # Resource %d, braces in comments {
+  file { "/etc/app/conf.d/${name}-%d.conf":
+    ensure  => file,
+    content => 'key = "{value}"\\n',
+    require => Package['app'],
+  }
+"""
+
+
+def generate_manifest(resources):
+    return "class bench {\n" + "".join(RESOURCE % (i, i) for i in range(resources)) + "}\n"
+
+
+def best_of(function, buffer, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(buffer)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def python_prescan(buffer):
+    return scanner.scan_structure(buffer, scanner.STRUCTURE_BYTES)
+
+
+def numpy_prescan(buffer):
+    return scanner.scan_structure_numpy(scanner.get_codes(buffer))
+
+
+def compare(name, buffer):
+    python_time, python_result = best_of(python_prescan, buffer)
+    numpy_time, numpy_result = best_of(numpy_prescan, buffer)
+    if python_result != numpy_result:
+        raise AssertionError("The prescan results of %s differ" % name)
+    print("%-40s %10d %12.2f %12.2f %8.1fx" % (name, len(buffer), python_time * 1000, numpy_time * 1000,
+                                               python_time / numpy_time))
+
+
+def main():
+    if scanner.numpy is None:
+        print("NumPy is not installed, only the pure Python prescan is available")
+        exit(1)
+
+    print("%-40s %10s %12s %12s %9s" % ("manifest", "bytes", "python ms", "numpy ms", "speedup"))
+    if len(sys.argv) > 1:
+        for path in sorted(f for f in get_all_files(os.path.join(sys.argv[1], "manifests")) if f.endswith(".pp")):
+            with open(path, "rb") as f:
+                buffer = f.read()
+            # Only ascii files, the byte offsets of the prescan are those of the content
+            if len(buffer.decode("utf-8", "replace")) == len(buffer):
+                compare(os.path.relpath(path, sys.argv[1]), buffer)
+    else:
+        for resources in (100, 1000, 10000, 100000):
+            compare("generated, %d resources" % resources, generate_manifest(resources).encode("ascii"))
+
+
+if __name__ == "__main__":
+    main()
@@ -40,6 +40,25 @@ check_regex_list = {
     CheckRegex.CHECK_CASE_ITEM_LINE: re.compile(r"'\S+' *: *{")
 }
 
+# Name of the rule every regex check belongs to, used to enable or disable the check
+CHECK_RULE_NAMES = {check: check.name[len("CHECK_"):].lower().replace("_", "-") for check in CheckRegex}
+
+VARIABLE_REFERENCE = re.compile(r"\$\{?((?:::)?[a-z_][a-zA-Z0-9_]*(?:::[a-z_][a-zA-Z0-9_]*)*)")
+
+# Start of a chain statement of resource references: Package['a'] -> File['b'] or [Package['a'], ...] ~> ...
+CHAIN_START = re.compile(r"\[?\s*[A-Z][a-zA-Z0-9_]*(?:::[A-Z][a-zA-Z0-9_]*)*\[")
+CHAIN_ARROW = re.compile(r"[-~]>")
+CHAIN_CONTINUES = re.compile(r"[-~]>\s*$")
+
+# Conditional statements, their branches are walked like the items of a case
+CONDITIONAL_START = re.compile(r"(if|unless)\b")
+CONDITIONAL_NEXT = re.compile(r"\s*(elsif|else)\b")
+
+# Variables that are always available in a puppet scope, without being assigned in the manifest
+BUILTIN_VARIABLES = ["facts", "trusted", "server_facts", "settings", "title", "name", "module_name",
+                     "caller_module_name", "environment", "clientcert", "clientversion", "servername", "serverip",
+                     "serverversion"]
+
 LOG_MESSAGES = {
     CheckRegex.CHECK_RESOURCE_FIRST_LINE: (LOG_TYPE_ERROR, "Resource invalid"),
     CheckRegex.CHECK_RESOURCE_ITEM_POINTER: (LOG_TYPE_ERROR, "Resource item does not have a valid format"),
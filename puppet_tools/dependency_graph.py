@@ -0,0 +1,167 @@
+import re
+
+RESOURCE_REFERENCE = re.compile(r"([A-Z][a-zA-Z0-9_]*(?:::[A-Z][a-zA-Z0-9_]*)*)\[\s*['\"]([^'\"]+)['\"]\s*\]")
+
+# Metaparameters pointing to resources which have to be applied before the resource itself
+BEFORE_SELF_PARAMETERS = ["require", "subscribe"]
+# Metaparameters pointing to resources which have to be applied after the resource itself
+AFTER_SELF_PARAMETERS = ["before", "notify"]
+
+
+def normalize_title(title):
+    return title.replace("'", "").replace('"', "").replace(",", "").strip()
+
+
+def normalize_path(path):
+    path = normalize_title(path)
+    return path.rstrip("/") if len(path) > 1 else path
+
+
+def resource_keys(resource):
+    """
+    All (type, title) keys a resource can be referenced by: its title, the path of a file and its alias.
+    """
+    keys = [(resource.typ, normalize_title(resource.name))]
+    if resource.typ == "file":
+        keys.append((resource.typ, normalize_path(resource.name)))
+        path = resource.get_value_for_item_name("path")
+        if path:
+            keys.append((resource.typ, normalize_path(path)))
+    alias = resource.get_value_for_item_name("alias")
+    if alias:
+        keys.append((resource.typ, normalize_title(alias)))
+    return keys
+
+
+def get_references(value):
+    return [(typ.lower(), title) for typ, title in RESOURCE_REFERENCE.findall(value)]
+
+
+class DependencyGraph:
+    """
+    Ordering graph between resources as an adjacency list, resources are numbered with integer node ids.
+    Edges come from metaparameters, arrows between declarations and chain statements of references, references to
+    the classes in class_names are resolved but don't add edges.
+    """
+
+    def __init__(self, resources, chains=(), class_names=()):
+        self.resources = []
+        self.ids = {}
+        self.edges = []
+        self.dangling = []
+        self.class_names = set(class_names)
+
+        for resource in resources:
+            self.add_resource(resource)
+        for node, resource in enumerate(self.resources):
+            self.add_resource_edges(node, resource)
+        for chain in chains:
+            self.add_chain_edges(chain)
+
+    def add_resource(self, resource):
+        node = len(self.resources)
+        self.resources.append(resource)
+        self.edges.append([])
+        for key in resource_keys(resource):
+            self.ids.setdefault(key, node)
+        return node
+
+    def find_node(self, key):
+        node = self.ids.get(key)
+        if node is None and key[0] == "file":
+            node = self.ids.get((key[0], normalize_path(key[1])))
+        return node
+
+    def is_class(self, key):
+        return key[0] == "class" and normalize_title(key[1]).lstrip(":") in self.class_names
+
+    def add_resource_edges(self, node, resource):
+        if resource.dependency_target:
+            target = self.find_node(resource.dependency_target)
+            if target is not None:
+                self.edges[node].append(target)
+
+        for item in resource.items:
+            name, value = item.split("=>", 1)
+            name = name.strip()
+            if name not in BEFORE_SELF_PARAMETERS and name not in AFTER_SELF_PARAMETERS:
+                continue
+            for key in get_references(value):
+                other = self.find_node(key)
+                if other is None:
+                    if not self.is_class(key):
+                        self.dangling.append((resource, name, key))
+                elif name in BEFORE_SELF_PARAMETERS:
+                    self.edges[other].append(node)
+                else:
+                    self.edges[node].append(other)
+
+    def add_chain_edges(self, chain):
+        """
+        Every resource of a step of the chain is applied before every resource of the next step.
+        """
+        steps = []
+        for group in chain.groups:
+            nodes = []
+            for key in group:
+                node = self.find_node(key)
+                if node is not None:
+                    nodes.append(node)
+                elif not self.is_class(key):
+                    self.dangling.append((chain, "chains", key))
+            steps.append(nodes)
+
+        for before, after in zip(steps, steps[1:]):
+            for node in before:
+                self.edges[node].extend(after)
+
+    def strongly_connected_components(self):
+        """
+        Tarjan's algorithm with an explicit stack, linear in the number of nodes and edges.
+        """
+        size = len(self.resources)
+        index = [-1] * size
+        low = [0] * size
+        on_stack = [False] * size
+        stack = []
+        components = []
+        counter = 0
+
+        for root in range(size):
+            if index[root] != -1:
+                continue
+            work = [(root, 0)]
+            while work:
+                node, child = work.pop()
+                if child == 0:
+                    index[node] = low[node] = counter
+                    counter += 1
+                    stack.append(node)
+                    on_stack[node] = True
+
+                edges = self.edges[node]
+                if child < len(edges):
+                    work.append((node, child + 1))
+                    other = edges[child]
+                    if index[other] == -1:
+                        work.append((other, 0))
+                    elif on_stack[other]:
+                        low[node] = min(low[node], index[other])
+                    continue
+
+                if low[node] == index[node]:
+                    component = []
+                    while True:
+                        other = stack.pop()
+                        on_stack[other] = False
+                        component.append(other)
+                        if other == node:
+                            break
+                    components.append(component)
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+        return components
+
+    def cycles(self):
+        return [sorted(c) for c in self.strongly_connected_components() if len(c) > 1 or c[0] in self.edges[c[0]]]
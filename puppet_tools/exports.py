@@ -0,0 +1,102 @@
+import json
+import os
+
+from .dependency_graph import resource_keys, normalize_title, normalize_path
+
+EXPORTS_VERSION = 1
+EXPORTS_FILE = "puppet-tools-exports.json"
+METADATA_FILE = "metadata.json"
+
+
+class ModuleExports:
+    """
+    Symbols a module exports to the modules depending on it: its class names and the (type, title) keys of its
+    resources.
+    """
+
+    def __init__(self, module, classes=(), resources=()):
+        self.module = module
+        self.classes = set(classes)
+        self.resources = set(resources)
+
+    def __repr__(self):
+        return '<ModuleExports: %s, classes: %d, resources: %d>' % (self.module, len(self.classes),
+                                                                     len(self.resources))
+
+
+def build_exports(summaries, module):
+    """
+    Exports of the classes the module defines, only a class named after the module or in its namespace can be
+    autoloaded from it.
+    """
+    exports = ModuleExports(module)
+    for summary in summaries:
+        exports.classes.update(c.name for c in summary.classes
+                               if c.name == module or c.name.startswith(module + "::"))
+        for r in summary.resources:
+            exports.resources.update(resource_keys(r))
+    return exports
+
+
+def write_exports(path, exports):
+    with open(path, 'w') as f:
+        json.dump({
+            "version": EXPORTS_VERSION,
+            "module": exports.module,
+            "classes": sorted(exports.classes),
+            "resources": {typ: sorted(t for k, t in exports.resources if k == typ)
+                          for typ in sorted(set(k for k, _ in exports.resources))}
+        }, f, indent=1)
+
+
+def read_exports(path):
+    with open(path, 'r') as f:
+        data = json.load(f)
+    if data.get("version") != EXPORTS_VERSION:
+        raise ValueError("Exports '%s' has unsupported version: %s" % (path, data.get("version")))
+    resources = [(typ, title) for typ, titles in data["resources"].items() for title in titles]
+    return ModuleExports(data["module"], data["classes"], resources)
+
+
+def get_dependency_names(module_dir):
+    """
+    Names of the modules in the dependencies of the metadata.json of a module, 'author/name' and 'author-name'
+    both give 'name'.
+    """
+    metadata = os.path.join(module_dir, METADATA_FILE)
+    if not os.path.isfile(metadata):
+        return []
+    with open(metadata, 'r') as f:
+        data = json.load(f)
+    names = [d["name"].replace("/", "-").split("-", 1)[-1] for d in data.get("dependencies", []) if d.get("name")]
+    return list(dict.fromkeys(names))
+
+
+def load_dependency_exports(module_dir, modulepath):
+    """
+    Read the exports of every dependency from the first directory of the modulepath that has it.
+    Returns the exports and the names of the dependencies without exports.
+    """
+    exports = []
+    missing = []
+    for name in get_dependency_names(module_dir):
+        paths = [os.path.join(directory, name, EXPORTS_FILE) for directory in modulepath]
+        path = next((p for p in paths if os.path.isfile(p)), None)
+        if path:
+            exports.append(read_exports(path))
+        else:
+            missing.append(name)
+    return exports, missing
+
+
+def find_exported_class(dependencies, name):
+    return next((d.module for d in dependencies if name in d.classes), None)
+
+
+def find_exported_resource(dependencies, key):
+    """
+    Name of the dependency which has a resource with the (type, title) key, file titles match on their path.
+    """
+    typ, title = key[0], normalize_title(key[1])
+    keys = [(typ, title), (typ, normalize_path(title))] if typ == "file" else [(typ, title)]
+    return next((d.module for d in dependencies if any(k in d.resources for k in keys)), None)
@@ -0,0 +1,124 @@
+import os
+import sqlite3
+
+from .dependency_graph import get_references
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    module TEXT NOT NULL,
+    path TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    UNIQUE (module, path)
+);
+CREATE TABLE IF NOT EXISTS objects (
+    id INTEGER PRIMARY KEY,
+    file_id INTEGER NOT NULL REFERENCES files (id) ON DELETE CASCADE,
+    kind TEXT NOT NULL,
+    type TEXT,
+    name TEXT NOT NULL,
+    line_number INTEGER
+);
+CREATE TABLE IF NOT EXISTS attributes (
+    object_id INTEGER NOT NULL REFERENCES objects (id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS refs (
+    object_id INTEGER NOT NULL REFERENCES objects (id) ON DELETE CASCADE,
+    parameter TEXT NOT NULL,
+    type TEXT NOT NULL,
+    title TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS objects_file ON objects (file_id);
+CREATE INDEX IF NOT EXISTS objects_kind_name ON objects (kind, name);
+CREATE INDEX IF NOT EXISTS objects_type_name ON objects (type, name);
+CREATE INDEX IF NOT EXISTS attributes_object ON attributes (object_id);
+CREATE INDEX IF NOT EXISTS attributes_name_value ON attributes (name, value);
+CREATE INDEX IF NOT EXISTS refs_object ON refs (object_id);
+CREATE INDEX IF NOT EXISTS refs_type_title ON refs (type, title);
+"""
+
+
+def connect(database):
+    connection = sqlite3.connect(database)
+    connection.execute("PRAGMA foreign_keys = ON")
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def insert_object(cursor, file_id, kind, typ, name, line_number):
+    cursor.execute("INSERT INTO objects (file_id, kind, type, name, line_number) VALUES (?, ?, ?, ?, ?)",
+                   (file_id, kind, typ, name, line_number))
+    return cursor.lastrowid
+
+
+def insert_summary(cursor, file_id, summary):
+    for kind, symbols in [("class", summary.classes), ("include", summary.includes),
+                          ("case_item", summary.case_items), ("variable", summary.variables)]:
+        cursor.executemany("INSERT INTO objects (file_id, kind, type, name, line_number) VALUES (?, ?, NULL, ?, ?)",
+                           [(file_id, kind, s.name.strip(), s.line_number) for s in symbols])
+
+    for r in summary.resources:
+        object_id = insert_object(cursor, file_id, "resource", r.typ, r.name, r.line_number)
+        attributes = []
+        references = []
+        for item in r.items:
+            name, value = item.split("=>", 1)
+            name = name.strip()
+            value = value.strip().rstrip(",").strip()
+            attributes.append((object_id, name, value))
+            references += [(object_id, name, typ, title) for typ, title in get_references(value)]
+        if r.dependency_target:
+            references.append((object_id, "->",) + tuple(r.dependency_target))
+        cursor.executemany("INSERT INTO attributes (object_id, name, value) VALUES (?, ?, ?)", attributes)
+        cursor.executemany("INSERT INTO refs (object_id, parameter, type, title) VALUES (?, ?, ?, ?)", references)
+
+    # A chain is one object with the references of every step, the parameter is the number of the step
+    for c in summary.chains:
+        name = " -> ".join(", ".join("%s['%s']" % (typ.capitalize(), title) for typ, title in group)
+                           for group in c.groups)
+        object_id = insert_object(cursor, file_id, "chain", None, name, c.line_number)
+        cursor.executemany("INSERT INTO refs (object_id, parameter, type, title) VALUES (?, ?, ?, ?)",
+                           [(object_id, "step %d" % step, typ, title)
+                            for step, group in enumerate(c.groups) for typ, title in group])
+
+
+def get_module_name(summaries):
+    class_names = [c.name for s in summaries for c in s.classes]
+    return class_names[0].split("::")[0] if class_names else None
+
+
+def export_inventory(database, module_dir, summaries):
+    """
+    Write the summaries of a module into the SQLite database, only files with a changed digest are rewritten.
+    Returns the number of files that were written.
+    """
+    module = get_module_name(summaries) or os.path.basename(module_dir)
+    connection = connect(database)
+    written = 0
+
+    with connection:
+        cursor = connection.cursor()
+        stored = {path: (file_id, digest) for file_id, path, digest in
+                  cursor.execute("SELECT id, path, digest FROM files WHERE module = ?", (module,))}
+        paths = set()
+
+        for summary in summaries:
+            path = os.path.relpath(summary.path, module_dir)
+            paths.add(path)
+            file_id, digest = stored.get(path, (None, None))
+            if digest == summary.digest:
+                continue
+            if file_id is not None:
+                cursor.execute("DELETE FROM files WHERE id = ?", (file_id,))
+            cursor.execute("INSERT INTO files (module, path, digest) VALUES (?, ?, ?)",
+                           (module, path, summary.digest))
+            insert_summary(cursor, cursor.lastrowid, summary)
+            written += 1
+
+        for path in set(stored) - paths:
+            cursor.execute("DELETE FROM files WHERE id = ?", (stored[path][0],))
+
+    connection.close()
+    return written
@@ -1,24 +1,44 @@
 import os
+import sys
 import time
 import argparse
 
 from termcolor import colored
 
 from .constants import SPLIT_TOKEN, LOG_TYPE_FATAL, LOG_TYPE_ERROR, LOG_TYPE_WARNING, LOG_TYPE_INFO, LOG_TYPE_DEBUG
-from .parser import walk_content
+from .exports import EXPORTS_FILE, build_exports, write_exports
+from .inventory import export_inventory, get_module_name
+from .parser import walk_content, set_max_depth, set_max_parse_time, start_deadline, DEFAULT_MAX_DEPTH
 from .puppet_objects.puppet_file import PuppetFile
-from .utility import get_file_contents, get_all_files, add_log, clear_logs, get_logs, logs_contains_error
+from .rules import PARSER_RULES, RULES, select_rules, read_rule_config
+from .scanner import read_manifest, scan_content, set_use_numpy, set_max_file_size
+from .shard import parse_shard, partition_files, write_partial_result, read_partial_results
+from .summary import summarize
+from .templates import set_cache_dir
+from .utility import ParseError, get_all_files, add_log, clear_logs, get_logs, logs_contains_error, \
+    prefetch_file_contents, set_disabled_rules
 from .validate import validate_puppet_module
 
+CONFIG_FILE = ".puppet-tools.cfg"
+
 
 PARSER_ERROR = False
 VALIDATION_ERROR = False
 
 
-def process_file(path) -> PuppetFile:
-    content = get_file_contents(path)
+def process_file(path, manifest=None) -> PuppetFile:
+    # The budget of a file covers reading and scanning it as well as walking it, a manifest read ahead brings the
+    # deadline it was read under
+    if manifest is None:
+        manifest = read_manifest(path, start_deadline())
+    elif isinstance(manifest, str):
+        manifest = scan_content(manifest, start_deadline())
+    elif manifest.deadline:
+        manifest.deadline.resume()
+    deadline = manifest.deadline
     puppet_file = PuppetFile(path)
-    walk_content(content, puppet_file)
+    puppet_file.digest = manifest.digest
+    walk_content(manifest.content, puppet_file, structure=manifest.structure, deadline=deadline)
     return puppet_file
 
 
@@ -40,16 +60,50 @@ def print_logs(log_level=1):
     clear_logs()
 
 
-def parse(puppet_files, path, log_level):
+def read_ahead_manifest(path):
+    """
+    Read a manifest in a background thread, the clock of its deadline is paused until process_file walks it.
+    """
+    manifest = read_manifest(path, start_deadline())
+    if manifest.deadline:
+        manifest.deadline.pause()
+    return manifest
+
+
+def read_files(puppet_files, read_ahead=0):
+    if read_ahead > 0:
+        yield from prefetch_file_contents(puppet_files, workers=min(read_ahead, 4), queue_size=read_ahead,
+                                          reader=read_ahead_manifest)
+    else:
+        for f in puppet_files:
+            yield f, None, None
+
+
+def parse(puppet_files, path, log_level, read_ahead=0, stream=False, print_tree=False, file_logs=None):
+    """
+    Parse all files, in stream mode every file is reduced to a summary right away and the tree is discarded.
+    When file_logs is a list the (path, logs) of every file are appended to it.
+    """
     global PARSER_ERROR
     total = []
     start = time.time()
 
-    for f in puppet_files:
+    for f, content, error in read_files(puppet_files, read_ahead):
         print(colored("Processing file: .%s" % f.replace(path, ""), 'cyan'))
 
         try:
-            total.append(process_file(f))
+            if error:
+                raise error
+            puppet_file = process_file(f, content)
+            if stream:
+                if print_tree:
+                    print(puppet_file)
+                    puppet_file.print_items()
+                total.append(summarize(puppet_file))
+            else:
+                total.append(puppet_file)
+        except ParseError as e:
+            add_log(f, LOG_TYPE_FATAL, (0, 0), "FATAL: " + str(e), "")
         except Exception as e:
             import traceback
             add_log(f, LOG_TYPE_FATAL, (0, 0), "FATAL: Panic during file parsing, " + str(e), "")
@@ -58,32 +112,111 @@ def parse(puppet_files, path, log_level):
         if logs_contains_error():
             PARSER_ERROR = True
 
+        if file_logs is not None:
+            file_logs.append((f, list(get_logs())))
+
         print_logs(log_level)
 
     print("parsing took %f seconds" % (time.time() - start))
     return total
 
 
-def main(path, log_level=LOG_TYPE_WARNING, print_tree=False, only_parse=True):
+def replay(partial_files, path, log_level, print_tree=False):
+    """
+    Print the parse results of sharded runs as if the files were parsed here, returns the summaries.
+    """
+    global PARSER_ERROR
+    total = []
+    start = time.time()
+
+    for f, logs, summary in partial_files:
+        print(colored("Processing file: .%s" % f.replace(path, ""), 'cyan'))
+        if summary:
+            if print_tree:
+                print(summary)
+            total.append(summary)
+        for log_item in logs:
+            add_log(*log_item)
+
+        if logs_contains_error():
+            PARSER_ERROR = True
+
+        print_logs(log_level)
+
+    print("parsing took %f seconds" % (time.time() - start))
+    return total
+
+
+def find_puppet_files(path):
     files = get_all_files(os.path.join(path, "manifests"))
-    puppet_files = [f for f in files if f.endswith(".pp") and not f.split(SPLIT_TOKEN)[-1].startswith(".")]
+    return sorted(f for f in files if f.endswith(".pp") and not f.split(SPLIT_TOKEN)[-1].startswith("."))
+
+
+def main(path, log_level=LOG_TYPE_WARNING, print_tree=False, only_parse=True, read_ahead=0, stream=False,
+         shard=None, partial_output=None, export_db=None, rule_timing=False, export_symbols=False, modulepath=None):
+    puppet_files = find_puppet_files(path)
 
     path = os.path.normpath(path)
     path = os.path.abspath(path)
 
-    total = parse(puppet_files, path, log_level)
+    if shard:
+        index, count = shard
+        puppet_files = partition_files(puppet_files, count)[index - 1]
+        file_logs = []
+        total = parse(puppet_files, path, log_level, read_ahead, True, print_tree, file_logs)
+        partial_output = partial_output or "puppet-tools-shard-%d-of-%d.json" % shard
+        write_partial_result(partial_output, shard, path, file_logs, total)
+        print("Partial result of shard %d/%d written to: %s" % (index, count, partial_output))
+        return
 
-    if print_tree:
+    total = parse(puppet_files, path, log_level, read_ahead, stream, print_tree)
+
+    if print_tree and not stream:
         for i in total:
             print(i)
             i.print_items()
 
+    summaries = total if stream else [summarize(f) for f in total]
+
+    if export_db:
+        start = time.time()
+        written = export_inventory(export_db, path, summaries)
+        print("exporting %d changed files to %s took %f seconds" % (written, export_db, time.time() - start))
+
+    if export_symbols:
+        exports_path = os.path.join(path, EXPORTS_FILE)
+        write_exports(exports_path, build_exports(summaries, get_module_name(summaries) or os.path.basename(path)))
+        print("Exports of the module written to: %s" % exports_path)
+
     if only_parse:
         return
 
+    validate(summaries, path, log_level, rule_timing, modulepath)
+
+
+def merge(path, partial_results, log_level=LOG_TYPE_WARNING, print_tree=False, only_parse=False, rule_timing=False,
+          modulepath=None):
+    puppet_files = find_puppet_files(path)
+
+    path = os.path.normpath(path)
+    path = os.path.abspath(path)
+
+    partial_files = read_partial_results(partial_results, path)
+    if [f[0] for f in partial_files] != puppet_files:
+        raise ValueError("The partial results don't cover the manifests of the module at path")
+
+    total = replay(partial_files, path, log_level, print_tree)
+
+    if only_parse:
+        return
+
+    validate(total, path, log_level, rule_timing, modulepath)
+
+
+def validate(summaries, path, log_level, rule_timing=False, modulepath=None):
     start = time.time()
 
-    validate_puppet_module(total, path)
+    validate_puppet_module(summaries, path, rule_timing, modulepath)
 
     global VALIDATION_ERROR
     if logs_contains_error():
@@ -97,7 +230,123 @@ def main(path, log_level=LOG_TYPE_WARNING, print_tree=False, only_parse=True):
     print(colored("Validation:\tERROR", "red") if VALIDATION_ERROR else colored("Validation:\tSuccess", "green"))
 
 
+def add_rule_arguments(my_parser):
+    my_parser.add_argument("--rules",
+                           type=str,
+                           help="Comma separated list of the only rules to check")
+
+    my_parser.add_argument("--disable-rules",
+                           type=str,
+                           help="Comma separated list of rules to skip")
+
+    my_parser.add_argument("-c",
+                           "--config",
+                           type=str,
+                           help="Config file with enable and/or disable options in a [rules] section "
+                                "(default: %s in the module directory)" % CONFIG_FILE)
+
+    my_parser.add_argument("--rule-timing",
+                           action='store_true',
+                           help="Print the time spent per validation rule")
+
+    my_parser.add_argument("-m",
+                           "--modulepath",
+                           type=str,
+                           help="Directories to find the exports of the dependencies in metadata.json in, separated "
+                                "by '%s' (default: the directory containing the module)" % os.pathsep)
+
+
+def apply_rule_arguments(args, path):
+    enable, disable = [], []
+
+    config = args.config or os.path.join(path, CONFIG_FILE)
+    if args.config and not os.path.isfile(config):
+        print("The config file specified does not exist")
+        exit(1)
+    if os.path.isfile(config):
+        enable, disable = read_rule_config(config)
+
+    if args.rules:
+        enable = [name.strip() for name in args.rules.split(",") if name.strip()]
+    if args.disable_rules:
+        disable += [name.strip() for name in args.disable_rules.split(",") if name.strip()]
+
+    try:
+        set_disabled_rules(select_rules(enable, disable))
+    except ValueError as e:
+        print(e)
+        exit(1)
+
+
+def get_modulepath(args):
+    return [p for p in args.modulepath.split(os.pathsep) if p] if args.modulepath else None
+
+
+def print_rules():
+    print("Parser rules:")
+    for name, description in PARSER_RULES.items():
+        print("  %s:\t%s" % (name, description))
+    print("Validation rules:")
+    for name, rule in RULES.items():
+        print("  %s:\t%s" % (name, rule.description))
+
+
+def merge_entry(arguments):
+    my_parser = argparse.ArgumentParser(
+        prog="puppet-tools merge",
+        description="Merge the partial results of sharded runs and validate the module once"
+    )
+
+    my_parser.add_argument("-t",
+                           "--print-tree",
+                           action='store_true',
+                           help="Print the summaries of the parsed files")
+
+    my_parser.add_argument("-p",
+                           "--only-parse",
+                           action='store_true',
+                           help="Only report the parse results of the shards")
+
+    add_rule_arguments(my_parser)
+
+    my_parser.add_argument("-l",
+                           "--log-level",
+                           type=int,
+                           default=LOG_TYPE_WARNING,
+                           help="Set minimum log level (Info=2, Warning=3, Error=4, Fatal=5) (default: Warning)")
+
+    my_parser.add_argument("Path",
+                           metavar="path",
+                           type=str,
+                           help="the path to the puppet module the shards were run on")
+
+    my_parser.add_argument("Partials",
+                           metavar="partial",
+                           type=str,
+                           nargs="+",
+                           help="partial result files written by --shard")
+
+    args = my_parser.parse_args(arguments)
+
+    if not os.path.isdir(args.Path):
+        print("The path specified does not exist")
+        exit(1)
+
+    apply_rule_arguments(args, args.Path)
+
+    try:
+        merge(args.Path, args.Partials, log_level=args.log_level, print_tree=args.print_tree,
+              only_parse=args.only_parse, rule_timing=args.rule_timing, modulepath=get_modulepath(args))
+    except ValueError as e:
+        print(e)
+        exit(1)
+
+
 def entry():
+    if sys.argv[1:2] == ["merge"]:
+        merge_entry(sys.argv[2:])
+        return
+
     my_parser = argparse.ArgumentParser(
         description="Puppet Tools, including parser, linter and validator functions"
     )
@@ -118,16 +367,84 @@ def entry():
                            default=LOG_TYPE_WARNING,
                            help="Set minimum log level (Info=2, Warning=3, Error=4, Fatal=5) (default: Warning)")
 
+    my_parser.add_argument("-r",
+                           "--read-ahead",
+                           type=int,
+                           default=0,
+                           help="Read up to this many files ahead in background threads while parsing (default: 0, off)")
+
+    my_parser.add_argument("-s",
+                           "--stream",
+                           action='store_true',
+                           help="Reduce every file to a symbol summary right after parsing to limit memory usage")
+
+    my_parser.add_argument("--shard",
+                           type=str,
+                           help="Only parse shard i of N (formatted as i/N) of the manifests, balanced by file size, "
+                                "and write a partial result for 'puppet-tools merge'")
+
+    my_parser.add_argument("--partial-output",
+                           type=str,
+                           help="File to write the partial result of a shard to "
+                                "(default: puppet-tools-shard-<i>-of-<N>.json)")
+
+    my_parser.add_argument("-e",
+                           "--export-db",
+                           type=str,
+                           help="Export the parsed objects to this SQLite database, only changed files are updated")
+
+    my_parser.add_argument("-x",
+                           "--export-symbols",
+                           action='store_true',
+                           help="Write the classes and resources of the module to %s in the module directory, for "
+                                "the validation of modules depending on it" % EXPORTS_FILE)
+
+    my_parser.add_argument("--max-depth",
+                           type=int,
+                           default=DEFAULT_MAX_DEPTH,
+                           help="Maximum nesting depth of classes, cases and case items in a file "
+                                "(default: %d)" % DEFAULT_MAX_DEPTH)
+
+    my_parser.add_argument("--max-file-size",
+                           type=int,
+                           default=0,
+                           help="Skip files larger than this many bytes with a fatal error (default: 0, no limit)")
+
+    my_parser.add_argument("--max-parse-time",
+                           type=float,
+                           default=0,
+                           help="Stop parsing a file after this many seconds and skip it with a fatal error "
+                                "(default: 0, no limit)")
+
+    my_parser.add_argument("--no-numpy",
+                           action='store_true',
+                           help="Prescan files in pure Python even when NumPy is installed")
+
+    my_parser.add_argument("--cache-dir",
+                           help="Keep the results of scanned templates in this directory between runs "
+                                "(default: off)")
+
+    add_rule_arguments(my_parser)
+
+    my_parser.add_argument("--list-rules",
+                           action='store_true',
+                           help="Print all rules and exit")
+
     my_parser.add_argument("Path",
                            metavar="path",
                            type=str,
+                           nargs="?",
                            help="the path to a puppet module")
 
     args = my_parser.parse_args()
 
+    if args.list_rules:
+        print_rules()
+        return
+
     check_path = args.Path
 
-    if not os.path.isdir(check_path):
+    if not check_path or not os.path.isdir(check_path):
         print("The path specified does not exist")
         exit(1)
 
@@ -136,7 +453,25 @@ def entry():
         print("Not a valid puppet module structure at path")
         exit(1)
 
-    main(check_path, log_level=args.log_level, print_tree=args.print_tree, only_parse=args.only_parse)
+    apply_rule_arguments(args, check_path)
+    set_max_depth(args.max_depth)
+    set_max_file_size(args.max_file_size)
+    set_max_parse_time(args.max_parse_time)
+    set_use_numpy(not args.no_numpy)
+    set_cache_dir(args.cache_dir)
+
+    shard = None
+    if args.shard:
+        try:
+            shard = parse_shard(args.shard)
+        except ValueError as e:
+            print(e)
+            exit(1)
+
+    main(check_path, log_level=args.log_level, print_tree=args.print_tree, only_parse=args.only_parse,
+         read_ahead=args.read_ahead, stream=args.stream, shard=shard, partial_output=args.partial_output,
+         export_db=args.export_db, rule_timing=args.rule_timing, export_symbols=args.export_symbols,
+         modulepath=get_modulepath(args))
 
 
 if __name__ == '__main__':
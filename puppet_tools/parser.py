@@ -1,23 +1,90 @@
-import string
+import itertools
+import re
 
-from .constants import LOG_TYPE_FATAL, CheckRegex, check_regex_list, LOG_TYPE_ERROR, LOG_TYPE_DEBUG, LOG_MESSAGES
+from .constants import LOG_TYPE_FATAL, CheckRegex, check_regex_list, LOG_TYPE_ERROR, LOG_TYPE_DEBUG, LOG_MESSAGES, \
+    LOG_TYPE_WARNING, LOG_TYPE_INFO, VARIABLE_REFERENCE, BUILTIN_VARIABLES, CHAIN_START, CHAIN_ARROW, \
+    CHAIN_CONTINUES, CONDITIONAL_START, CONDITIONAL_NEXT
+from .dependency_graph import get_references
 from .puppet_objects.puppet_block import PuppetBlock
 from .puppet_objects.puppet_case import PuppetCase
 from .puppet_objects.puppet_case_item import PuppetCaseItem
+from .puppet_objects.puppet_chain import PuppetChain
 from .puppet_objects.puppet_class import PuppetClass
 from .puppet_objects.puppet_include import PuppetInclude
 from .puppet_objects.puppet_resource import PuppetResource
+from .puppet_objects.puppet_scope import PuppetScope
 from .puppet_objects.puppet_variable import PuppetVariable
-from .utility import strip_comments, brace_count_verify, add_log, get_until, get_matching_end_brace, count_newlines, \
-    check_regex, ParseHelper
+from .scanner import prescan, count_lines
+from .utility import add_log, get_until, check_regex, check_regex_at, get_line_end, rule_enabled, ParseHelper, \
+    ParseError, BudgetError, Deadline
 
 
-def walk_content(content, puppet_file, line_number=1):
-    content = strip_comments(content)
-    result = brace_count_verify(content)
+BLOCK = "block"
+CASE = "case"
+CONDITIONAL = "conditional"
+
+DEFAULT_MAX_DEPTH = 256
+max_depth = DEFAULT_MAX_DEPTH
+# Maximum wall time in seconds to read, scan and walk a file, 0 is no limit
+max_parse_time = 0
+# Characters walked in one block or resource between checks of the deadline
+DEADLINE_CHECK_INTERVAL = 65536
+
+
+def set_max_depth(depth):
+    global max_depth
+    max_depth = depth
+
+
+def set_max_parse_time(seconds):
+    global max_parse_time
+    max_parse_time = seconds
+
+
+def start_deadline():
+    """
+    Deadline of max_parse_time for a file starting now, None without a limit.
+    """
+    return Deadline(max_parse_time) if max_parse_time else None
+
+
+class ParseFrame:
+    """
+    State of one block or case being walked, spans are [index, end) of the content of the file.
+    """
+    __slots__ = ["kind", "index", "end", "line_number", "item", "scope", "case_number", "item_scopes"]
+
+    def __init__(self, kind, index, end, line_number, item, scope):
+        self.kind = kind
+        self.index = index
+        self.end = end
+        self.line_number = line_number
+        self.item = item
+        self.scope = scope
+        self.case_number = None
+        self.item_scopes = []
+
+
+def walk_content(content, puppet_file, line_number=1, structure=None, deadline=None):
+    """
+    Parse content into puppet_file, structure is the result of prescan when the file is already scanned.
+    A BudgetError is raised when the deadline passes, without a deadline one of max_parse_time starts now.
+    """
+    if deadline is None:
+        deadline = start_deadline()
+    if structure is None:
+        structure = prescan(content, deadline)
+    result = structure.balance
     if result == 0:
-        block = walk_block(content, line_number, puppet_file)
+        try:
+            block = walk(content, structure, line_number, puppet_file, deadline)
+        except BudgetError:
+            raise
+        except ParseError as e:
+            add_log(puppet_file.name, LOG_TYPE_FATAL, (0, 0), str(e) + ", file can't be parsed", "")
+            return puppet_file
         puppet_file.add_item(block)
+        verify_variables_used(puppet_file)
     elif result < 0:
         add_log(puppet_file.name, LOG_TYPE_FATAL, (0, 0), "Too few start braces '{', file can't be parsed", "")
     elif result > 0:
@@ -26,149 +93,362 @@ def walk_content(content, puppet_file, line_number=1):
     return puppet_file
 
 
-def walk_block(content, line_number, puppet_file):
+def walk(content, structure, line_number, puppet_file, deadline=None):
+    """
+    Walk the content in one loop, nested classes, cases, case items, conditionals and their branches are pushed on
+    an explicit stack of frames.
+    """
     puppet_block = PuppetBlock()
-    index = 0
+    stack = [ParseFrame(BLOCK, 0, len(content), line_number, puppet_block, puppet_file.scope)]
+
+    while stack:
+        frame = stack[-1]
+        if deadline:
+            deadline.check("at line %d" % frame.line_number)
+        if frame.index >= frame.end:
+            stack.pop()
+            if frame.kind != BLOCK:
+                for item_scope in frame.item_scopes:
+                    item_scope.close()
+            if stack:
+                # The nested frame counted the lines of its span
+                stack[-1].line_number = frame.line_number
+            continue
+
+        if frame.kind == BLOCK:
+            child = walk_block(content, structure, frame, puppet_file, deadline)
+        elif frame.kind == CASE:
+            child = walk_case(content, structure, frame, puppet_file)
+        else:
+            child = walk_conditional(content, structure, frame, puppet_file)
+
+        if child:
+            if len(stack) >= max_depth:
+                raise ParseError("Maximum nesting depth of %d exceeded at line %d" % (max_depth, child.line_number))
+            stack.append(child)
+
+    return puppet_block
+
+
+def push_frame(frame, structure, kind, start, span, item, scope):
+    """
+    Create the frame for a nested span starting at start and move the frame past it, the line number of the frame
+    is updated when the nested frame is done.
+    """
+    child = ParseFrame(kind, span[0], span[1], frame.line_number + count_lines(structure, start, span[0]), item, scope)
+    frame.index = span[1]
+    return child
+
+
+def skip_frame(frame, structure, index):
+    frame.line_number += count_lines(structure, index, frame.end)
+    frame.index = frame.end
+
+
+CASE_COUNTER = itertools.count(1)
+
+
+def resolve_variables(text, scope, line_number, puppet_file):
+    undefined_enabled = rule_enabled("undefined-variable")
+    if not undefined_enabled and not rule_enabled("unused-variable"):
+        return
+
+    # Single quoted strings are not interpolated
+    for name in VARIABLE_REFERENCE.findall(re.sub(r"'[^']*'", "", text)):
+        if "::" in name or name in BUILTIN_VARIABLES:
+            continue
+        if not scope.lookup(name) and undefined_enabled:
+            add_log(puppet_file.name, LOG_TYPE_WARNING, (line_number, 0),
+                    "Variable '$%s' is used but not defined in this scope, may be a fact or class parameter" % name,
+                    text)
 
-    while index < len(content):
+
+def define_variable(puppet_variable, scope, puppet_file):
+    reassigned = scope.find_in_same_scope(puppet_variable.name) is not None
+    previous = scope.define(puppet_variable)
+    if previous and reassigned and rule_enabled("reassigned-variable"):
+        add_log(puppet_file.name, LOG_TYPE_ERROR, (puppet_variable.line_number, 0),
+                "Variable '$%s' is reassigned, first assigned on line %d" % (previous.name, previous.line_number),
+                str(puppet_variable))
+    elif previous and not reassigned and rule_enabled("shadowed-variable"):
+        add_log(puppet_file.name, LOG_TYPE_WARNING, (puppet_variable.line_number, 0),
+                "Variable '$%s' shadows the variable assigned on line %d" % (previous.name, previous.line_number),
+                str(puppet_variable))
+
+
+def verify_variables_used(puppet_file):
+    if not rule_enabled("unused-variable"):
+        return
+
+    for variable in sorted(puppet_file.scope.all_variables(), key=lambda v: v.line_number):
+        if not variable.references:
+            add_log(puppet_file.name, LOG_TYPE_INFO, (variable.line_number, 0),
+                    "Variable '$%s' is assigned but never used in this file, may be used in a template" %
+                    variable.name, str(variable))
+
+
+def walk_block(content, structure, frame, puppet_file, deadline=None):
+    """
+    Walk the block of frame until the end or until a nested block or case is found, which is returned as a new frame.
+    """
+    braces = structure.braces
+    puppet_block = frame.item
+    scope = frame.scope
+    index = frame.index
+    end = frame.end
+    next_check = index + DEADLINE_CHECK_INTERVAL if deadline else end
+
+    while index < end:
         char = content[index]
+        line_number = frame.line_number
+        if index >= next_check:
+            # A long line doesn't return to the walk loop
+            deadline.check("at line %d" % line_number)
+            next_check = index + DEADLINE_CHECK_INTERVAL
 
         if char == '\n':
-            line_number += 1
-            index += 1
-        elif char in ['}', '{']:
+            # Back to the walk loop once per line, which checks the time budget
+            frame.line_number += 1
+            frame.index = index + 1
+            return None
+        elif char in ['}', '{', ' ', '\t']:
             index += 1
+        elif char == '#':
+            # Comment till the end of the line
+            index = get_line_end(content, index, end)
         elif char == '$':
-            helper = ParseHelper(content, index)
-            helper.p1().until('=', save=True).p1().until('\n', save=True)
+            line_end = get_line_end(content, index, end)
+            helper = ParseHelper(content, index, braces, line_end)
+            helper.p1().until('=', save=True)
+            if helper.index() >= line_end:
+                add_log(puppet_file.name, LOG_TYPE_DEBUG, (line_number, 0), "Unimplemented? while walking block",
+                        content[index:line_end])
+                index = line_end
+                continue
+            helper.p1().until('\n', save=True)
 
             name, value = helper.results()
-            puppet_variable = PuppetVariable(name.lstrip().rstrip())
+            puppet_variable = PuppetVariable(name.lstrip().rstrip(), line_number)
             puppet_variable.set_value(value.lstrip().rstrip())
+            resolve_variables(puppet_variable.value, scope, line_number, puppet_file)
+            define_variable(puppet_variable, scope, puppet_file)
             puppet_block.add_item(puppet_variable)
             index = helper.index()
-        elif content[index:index + 2] == "->":
-            if isinstance(puppet_block.items[-1], PuppetResource):
+        elif content.startswith("->", index) or content.startswith("~>", index):
+            if puppet_block.items and isinstance(puppet_block.items[-1], PuppetResource):
                 puppet_block.items[-1].set_is_dependency()
             else:
                 add_log(puppet_file.name, LOG_TYPE_ERROR, (line_number, 0), "Dependency definition invalid",
                         content[index:index + 2])
-            index += 3
-        elif content[index:index + 7] == "include":
-            if not check_regex(content[index:], (line_number, 0), puppet_file, CheckRegex.CHECK_INCLUDE_LINE):
-                break
+            index += 2
+        elif CHAIN_START.match(content, index, end):
+            # A line ending with an arrow continues the chain on the next line
+            statement_end = get_line_end(content, index, end)
+            while statement_end < end and CHAIN_CONTINUES.search(content, index, statement_end):
+                statement_end = get_line_end(content, statement_end + 1, end)
+            groups = [get_references(step) for step in CHAIN_ARROW.split(content[index:statement_end])]
+            if len(groups) > 1 and all(groups):
+                puppet_block.add_item(PuppetChain(line_number, puppet_file.name, groups))
+            else:
+                add_log(puppet_file.name, LOG_TYPE_DEBUG, (line_number, 0), "Unimplemented? while walking block",
+                        content[index:statement_end])
+            frame.line_number += count_lines(structure, index, statement_end)
+            index = statement_end
+        elif content.startswith("include", index):
+            if not check_regex_at(content, index, end, (line_number, 0), puppet_file, CheckRegex.CHECK_INCLUDE_LINE):
+                skip_frame(frame, structure, index)
+                return None
 
-            helper = ParseHelper(content, index)
-            helper.ps(8).until([' ', '}'], save=True)
+            helper = ParseHelper(content, index, braces, end)
+            helper.ps(8).until([' ', '}', '\n'], save=True)
             name = helper.results()[0]
-            include = PuppetInclude(name)
+            include = PuppetInclude(name, line_number)
             puppet_block.add_item(include)
             index = helper.index()
-        elif content[index:index + 4] == "case":
-            if not check_regex(content[index:], (line_number, 0), puppet_file, CheckRegex.CHECK_CASE_LINE):
-                break
-            helper = ParseHelper(content, index)
-            c, line_count = helper.ps(5).until('{', save=True).get_content_till_end_brace()
+        elif content.startswith("case", index):
+            if not check_regex_at(content, index, end, (line_number, 0), puppet_file, CheckRegex.CHECK_CASE_LINE):
+                skip_frame(frame, structure, index)
+                return None
+            helper = ParseHelper(content, index, braces, end)
+            span = helper.ps(5).until('{', save=True).get_span_till_end_brace()
             name = helper.results()[0]
-            puppet_case = walk_case(c, name.rstrip(), line_number, puppet_file)
+            resolve_variables(name, scope, line_number, puppet_file)
+            puppet_case = PuppetCase(name.rstrip())
             puppet_block.add_item(puppet_case)
-            index = helper.index()
-            line_number += line_count
-        elif content[index:index + 5] == "class":
-            helper = ParseHelper(content, index)
-            if check_regex(content[index:], (line_number, 0), puppet_file, CheckRegex.CHECK_CLASS_LINE, disable_log=True):
-                c, line_count = helper.ps(6).until('{', save=True).get_content_till_end_brace()
-                name = helper.results()[0]
-                puppet_class = walk_class(c, name.rstrip(), line_number, puppet_file)
-                puppet_block.add_item(puppet_class)
-                index = helper.index()
-                line_number += line_count
-            elif check_regex(content[index:], (line_number, 0), puppet_file, CheckRegex.CHECK_CLASS_LINE2, disable_log=True):
-                helper.ps(6).until('{').save_index("brace_index").p1().until(':', save=True)
-                c, line_count = helper.get_content_till_end_brace("brace_index")
-                name = helper.results()[0]
-                puppet_class = walk_class(c, name.rstrip(), line_number, puppet_file)
-                puppet_block.add_item(puppet_class)
-                index = helper.index()
-                line_number += line_count
+            frame.index = index
+            child = push_frame(frame, structure, CASE, index, span, puppet_case, scope)
+            child.case_number = next(CASE_COUNTER)
+            return child
+        elif CONDITIONAL_START.match(content, index, end):
+            helper = ParseHelper(content, index, braces, end).until('{')
+            if helper.index() >= end:
+                add_log(puppet_file.name, LOG_TYPE_DEBUG, (line_number, 0), "Unimplemented? while walking block",
+                        content[index:get_line_end(content, index, end)])
+                skip_frame(frame, structure, index)
+                return None
+            chain_end = helper.get_span_till_end_brace()[1]
+            match = CONDITIONAL_NEXT.match(content, chain_end, end)
+            while match:
+                chain_end = ParseHelper(content, match.end(), braces, end).until('{').get_span_till_end_brace()[1]
+                match = CONDITIONAL_NEXT.match(content, chain_end, end)
+            frame.index = index
+            child = push_frame(frame, structure, CONDITIONAL, index, (index, chain_end), puppet_block, scope)
+            child.case_number = next(CASE_COUNTER)
+            return child
+        elif content.startswith("class", index):
+            helper = ParseHelper(content, index, braces, end)
+            is_declaration = False
+            if check_regex_at(content, index, end, (line_number, 0), puppet_file, CheckRegex.CHECK_CLASS_LINE,
+                              disable_log=True):
+                span = helper.ps(6).until('{', save=True).get_span_till_end_brace()
+            elif check_regex_at(content, index, end, (line_number, 0), puppet_file, CheckRegex.CHECK_CLASS_LINE2,
+                                disable_log=True):
+                is_declaration = True
+                helper.ps(6).until('{').save_index("brace_index").until(["'", '"']).p1() \
+                    .until(["'", '"'], save=True).until(':').p1()
+                span = helper.get_span_till_end_brace("brace_index")
             else:
                 log_type, message = LOG_MESSAGES[CheckRegex.CHECK_CLASS_LINE]
-                add_log(puppet_file.name, log_type, (line_number, 0), message, content[index:])
-                break
+                add_log(puppet_file.name, log_type, (line_number, 0), message,
+                        content[index:get_line_end(content, index, end)])
+                skip_frame(frame, structure, index)
+                return None
 
+            name = helper.results()[0].rstrip()
+            puppet_class = PuppetClass(name, line_number, is_declaration)
+            class_block = PuppetBlock()
+            puppet_class.add_item(class_block)
+            puppet_block.add_item(puppet_class)
+            frame.index = index
+            return push_frame(frame, structure, BLOCK, index, span, class_block, PuppetScope("class", name, scope))
         else:
+            line_end = get_line_end(content, index, end)
+            _, head_end = get_until(content, "\n:", index, end)
             items = [len(i) for i in PuppetResource.TYPES
-                     if content[index:].startswith(i) and "=>" not in get_until(content[index:], "\n", or_char=":")[0]]
+                     if content.startswith(i, index) and content.find("=>", index, head_end) == -1]
 
             if len(items) == 1:
-                text, size = get_until(content[index:], "\n")
-                if not check_regex(text, (line_number, 0), puppet_file, CheckRegex.CHECK_RESOURCE_FIRST_LINE):
-                    _, size = get_until(content[index:], '}')
-                    index += size
+                if not check_regex_at(content, index, end, (line_number, 0), puppet_file,
+                                      CheckRegex.CHECK_RESOURCE_FIRST_LINE):
+                    _, next_index = get_until(content, '}', index, end)
+                    frame.line_number += count_lines(structure, index, next_index)
+                    index = next_index
                 else:
                     item_len = items[0]
                     name = content[index:index + item_len]
-                    index += item_len
 
-                    helper = ParseHelper(content, index)
-                    c, line_count = helper.until('{').get_content_till_end_brace()
-                    puppet_resource = walk_resource(c, name, line_number, puppet_file)
+                    helper = ParseHelper(content, index + item_len, braces, end)
+                    span = helper.until('{').get_span_till_end_brace()
+                    if deadline:
+                        deadline.check("at line %d" % line_number)
+                    puppet_resource = walk_resource(content, span, name, line_number, puppet_file, scope,
+                                                    deadline)
+                    last_item = puppet_block.items[-1] if puppet_block.items else None
+                    if isinstance(last_item, PuppetResource) and last_item.is_dependency and \
+                            not last_item.dependency_target:
+                        last_item.set_dependency_target(puppet_resource)
                     puppet_block.add_item(puppet_resource)
-                    index = helper.p1().index()
-                    line_number += line_count
+                    frame.line_number += count_lines(structure, index, span[1])
+                    index = span[1]
             else:
-                if content[index] != ' ':
-                    text, size = get_until(content[index:] + '\n', "\n")
-                    add_log(puppet_file.name, LOG_TYPE_DEBUG, (line_number, 0), "Unimplemented? while walking block",
-                            text)
-                    index += size
-                index += 1
-    return puppet_block
-
+                add_log(puppet_file.name, LOG_TYPE_DEBUG, (line_number, 0), "Unimplemented? while walking block",
+                        content[index:line_end])
+                index = line_end
 
-def walk_class(content, name, line_number, puppet_file):
-    puppet_class = PuppetClass(name)
-    puppet_block = walk_block(content, line_number, puppet_file)
-    puppet_class.add_item(puppet_block)
-    return puppet_class
+    frame.index = index
+    return None
 
 
-def walk_case(content, name, line_number, puppet_file):
-    puppet_case = PuppetCase(name)
-    index = 0
+def walk_case(content, structure, frame, puppet_file):
+    """
+    Walk the case of frame until the next case item, which is returned as a new frame.
+    """
+    braces = structure.braces
+    index = frame.index
+    end = frame.end
 
-    while index < len(content):
+    while index < end:
         char = content[index]
+        line_number = frame.line_number
+
         if char == "'" or char == "\"":
-            if not check_regex(content[index:], (line_number, 0), puppet_file, CheckRegex.CHECK_CASE_ITEM_LINE):
-                break
-            helper = ParseHelper(content, index)
-            c, line_count = helper.p1().until(["'", '"'], save=True).until(':').until('{').get_content_till_end_brace()
+            if not check_regex_at(content, index, end, (line_number, 0), puppet_file, CheckRegex.CHECK_CASE_ITEM_LINE):
+                skip_frame(frame, structure, index)
+                return None
+            helper = ParseHelper(content, index, braces, end)
+            span = helper.p1().until(["'", '"'], save=True).until(':').until('{').get_span_till_end_brace()
             name = helper.results()[0]
-            puppet_case_item = PuppetCaseItem(name)
-            puppet_block = walk_block(c, line_number, puppet_file)
+            puppet_case_item = PuppetCaseItem(name, line_number)
+            item_scope = PuppetScope("case_item", name, frame.scope, (frame.case_number, len(frame.item_scopes)))
+            frame.item_scopes.append(item_scope)
+            puppet_block = PuppetBlock()
             puppet_case_item.add_item(puppet_block)
-            puppet_case.add_item(puppet_case_item)
-            index = helper.p1().index()
-            line_number = line_count
+            frame.item.add_item(puppet_case_item)
+            frame.index = index
+            return push_frame(frame, structure, BLOCK, index, span, puppet_block, item_scope)
+        elif char == '#':
+            index = get_line_end(content, index, end)
         elif char == '\n':
-            line_number += 1
-            index += 1
+            frame.line_number += 1
+            frame.index = index + 1
+            return None
         else:
             index += 1
 
-    return puppet_case
+    frame.index = index
+    return None
+
+
+def walk_conditional(content, structure, frame, puppet_file):
+    """
+    Walk the conditional of frame until the next if, elsif, unless or else branch, which is returned as a new frame.
+    The items of the branches are added to the enclosing block, their scopes record the branch like case items.
+    """
+    braces = structure.braces
+    index = frame.index
+    end = frame.end
+
+    while index < end:
+        char = content[index]
+
+        if char == '\n':
+            frame.line_number += 1
+            index += 1
+        elif char in ['}', ' ', '\t']:
+            index += 1
+        else:
+            match = CONDITIONAL_START.match(content, index, end) or CONDITIONAL_NEXT.match(content, index, end)
+            if not match:
+                skip_frame(frame, structure, index)
+                return None
+            helper = ParseHelper(content, match.end(), braces, end)
+            span = helper.until('{', save=True).get_span_till_end_brace()
+            resolve_variables(helper.results()[0], frame.scope, frame.line_number, puppet_file)
+            branch_scope = PuppetScope("branch", match.group(1), frame.scope,
+                                       (frame.case_number, len(frame.item_scopes)))
+            frame.item_scopes.append(branch_scope)
+            frame.index = index
+            return push_frame(frame, structure, BLOCK, index, span, frame.item, branch_scope)
+
+    frame.index = index
+    return None
 
 
-def walk_resource(content, typ, line_number, puppet_file):
+def walk_resource(content, span, typ, line_number, puppet_file, scope, deadline=None):
     puppet_resource = PuppetResource(typ, line_number, puppet_file.name)
-    helper = ParseHelper(content, 0)
+    puppet_resource.branches = scope.branches()
+    start, end = span
+    helper = ParseHelper(content, start, None, end)
     helper.until(["'", '"']).p1().until(["'", '"'], save=True).until(':').p1()
     index = helper.index()
     puppet_resource.name = helper.results()[0]
+    next_check = index + DEADLINE_CHECK_INTERVAL if deadline else end
 
-    while index < len(content):
+    while index < end:
         char = content[index]
+        if index >= next_check:
+            deadline.check("at line %d" % line_number)
+            next_check = index + DEADLINE_CHECK_INTERVAL
 
         if char == '\n':
             # Found end of line
@@ -176,9 +456,11 @@ def walk_resource(content, typ, line_number, puppet_file):
             index += 1
         elif char == '}':
             index += 1
-        elif char != ' ':
-            text, size = get_until(content[index:], ";", or_char='\n')
-            text2, _ = get_until(content[index + size + 1:] + "\n", "\n")
+        elif char == '#':
+            index = get_line_end(content, index, end)
+        elif char not in [' ', '\t']:
+            text, item_end = get_until(content, ";\n", index, end)
+            text2, _ = get_until(content, "\n", min(item_end + 1, end), end)
             if check_regex(text, (line_number, 0), puppet_file, CheckRegex.CHECK_RESOURCE_ITEM_POINTER):
                 if check_regex(text, (line_number, 0), puppet_file, CheckRegex.CHECK_RESOURCE_ITEM_VALUE):
                     # Next one may be ignored but makes a difference for the next check
@@ -188,7 +470,8 @@ def walk_resource(content, typ, line_number, puppet_file):
                     else:
                         check_regex(text, (line_number, 0), puppet_file, CheckRegex.CHECK_RESOURCE_ITEM_COMMA_WARN)
                         puppet_resource.add_item(text)
-            index += size if size > 0 else 1
+                    resolve_variables(text.split("=>", 1)[1], scope, line_number, puppet_file)
+            index = item_end if item_end > index else index + 1
         else:
             index += 1
     return puppet_resource
@@ -0,0 +1,21 @@
+from . import PuppetObject
+
+
+class PuppetChain(PuppetObject):
+    """
+    Chain statement of resource references, like Package['a'] -> File['b'] ~> Service['c'], groups holds the
+    (type, title) references of every step of the chain in order.
+    """
+
+    def __init__(self, line_number, file_name, groups=None):
+        self.line_number = line_number
+        self.file_name = file_name
+        self.groups = groups or []
+
+    def print_items(self, depth=0):
+        pass
+
+    def __repr__(self):
+        return '<PuppetChain: %s, file: %s>' % (" -> ".join(
+            ", ".join("%s['%s']" % (typ.capitalize(), title) for typ, title in group) for group in self.groups),
+            self.file_name)
@@ -3,8 +3,11 @@ from . import PuppetObject
 
 class PuppetClass(PuppetObject):
 
-    def __init__(self, name):
+    def __init__(self, name, line_number=0, is_declaration=False):
         self.name = name
+        self.line_number = line_number
+        # A resource-like declaration "class { 'name': }" of a class defined elsewhere
+        self.is_declaration = is_declaration
         self.items = []
 
     def add_item(self, item):
@@ -16,4 +19,4 @@ class PuppetClass(PuppetObject):
             i.print_items(depth + 1)
 
     def __repr__(self):
-        return '<PuppetClass: %s>' % self.name
+        return '<PuppetClass%s: %s>' % (" declaration" if self.is_declaration else "", self.name)
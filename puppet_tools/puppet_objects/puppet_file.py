@@ -1,5 +1,6 @@
 from puppet_tools.constants import SPLIT_TOKEN
 from . import PuppetObject
+from .puppet_scope import PuppetScope
 
 
 class PuppetFile(PuppetObject):
@@ -7,6 +8,8 @@ class PuppetFile(PuppetObject):
         self.name = path.split(SPLIT_TOKEN)[-1]
         self.path = path
         self.items = []
+        self.digest = None
+        self.scope = PuppetScope("file", self.name)
 
     def add_item(self, item):
         self.items.append(item)
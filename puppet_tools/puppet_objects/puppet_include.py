@@ -2,8 +2,9 @@ from . import PuppetObject
 
 
 class PuppetInclude(PuppetObject):
-    def __init__(self, name):
+    def __init__(self, name, line_number=0):
         self.name = name
+        self.line_number = line_number
 
     def print_items(self, depth=0):
         pass
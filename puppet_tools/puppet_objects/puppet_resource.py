@@ -17,6 +17,8 @@ class PuppetResource(PuppetObject):
     def __init__(self, typ, line_number, file_name):
         self.typ = typ
         self.is_dependency = False
+        self.dependency_target = None
+        self.branches = ()
         self.name = ""
         self.items = []
         self.line_number = line_number
@@ -41,5 +43,8 @@ class PuppetResource(PuppetObject):
     def set_is_dependency(self):
         self.is_dependency = True
 
+    def set_dependency_target(self, resource):
+        self.dependency_target = (resource.typ, resource.name)
+
     def __repr__(self):
         return '<PuppetResource \'%s\': \'%s\', dependency: %d, file: %s>' % (self.typ, self.name, self.is_dependency, self.file_name)
@@ -0,0 +1,92 @@
+# Case items and the branches of if, elsif, else and unless don't create a scope in puppet
+BRANCH_KINDS = ("case_item", "branch")
+
+
+class PuppetScope:
+    """
+    One level of the variable scope chain (file -> class -> case item or branch), variables are kept in a dict per
+    scope.
+    """
+
+    def __init__(self, kind, name, parent=None, branch=None):
+        self.kind = kind
+        self.name = name
+        self.parent = parent
+        # (case number, item number) for case items and branches, items of the same case or conditional are
+        # mutually exclusive
+        self.branch = branch
+        self.variables = {}
+        # Names assigned anywhere in the chain of the file, shared by all its scopes, a name that is not in it is
+        # found undefined without walking the parents
+        self.names = parent.names if parent else set()
+        self.children = []
+        if parent:
+            parent.children.append(self)
+
+    def define(self, variable):
+        """
+        Add a variable to this scope, returns the variable it replaces or shadows, None otherwise.
+        """
+        previous = self.lookup(variable.name, mark_used=False)
+        self.variables[variable.name] = variable
+        self.names.add(variable.name)
+        return previous
+
+    def lookup(self, name, mark_used=True):
+        if name not in self.names:
+            return None
+        scope = self
+        while scope:
+            variable = scope.variables.get(name)
+            if variable:
+                if mark_used:
+                    variable.references += 1
+                return variable
+            scope = scope.parent
+        return None
+
+    def find_in_same_scope(self, name):
+        """
+        Variable assigned in the same puppet scope, case items and branches are part of the scope of the nearest
+        class or file.
+        """
+        scope = self
+        while scope:
+            variable = scope.variables.get(name)
+            if variable or scope.kind not in BRANCH_KINDS:
+                return variable
+            scope = scope.parent
+        return None
+
+    def close(self):
+        """
+        Case items and branches don't create a scope in puppet, their variables are visible to the enclosing scope
+        once the whole case or conditional statement is walked.
+        """
+        if self.kind in BRANCH_KINDS and self.parent:
+            for name, variable in self.variables.items():
+                if name not in self.parent.variables:
+                    self.parent.variables[name] = variable
+
+    def branches(self):
+        scope = self
+        result = []
+        while scope:
+            if scope.branch:
+                result.append(scope.branch)
+            scope = scope.parent
+        return tuple(reversed(result))
+
+    def all_variables(self):
+        seen = set()
+        scopes = [self]
+        while scopes:
+            scope = scopes.pop()
+            for variable in scope.variables.values():
+                if id(variable) not in seen:
+                    seen.add(id(variable))
+                    yield variable
+            scopes.extend(scope.children)
+
+    def __repr__(self):
+        return '<PuppetScope %s: %s, variables: %s>' % (self.kind, self.name, ', '.join(self.variables))
@@ -2,9 +2,11 @@ from . import PuppetObject
 
 
 class PuppetVariable(PuppetObject):
-    def __init__(self, name):
+    def __init__(self, name, line_number=0):
         self.name = name
         self.value = None
+        self.line_number = line_number
+        self.references = 0
 
     def print_items(self, depth=0):
         print(self)
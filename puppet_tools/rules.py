@@ -0,0 +1,121 @@
+import configparser
+import time
+
+from .constants import CHECK_RULE_NAMES, LOG_MESSAGES
+
+NODE_KINDS = {
+    "class": "classes",
+    "include": "includes",
+    "case_item": "case_items",
+    "variable": "variables",
+    "resource": "resources",
+    "chain": "chains",
+    "template_call": "template_calls"
+}
+
+# Checks done by the parser while walking the files
+PARSER_RULES = dict([(CHECK_RULE_NAMES[check], message) for check, (_, message) in LOG_MESSAGES.items()] + [
+    ("undefined-variable", "Variables are assigned before they are used"),
+    ("reassigned-variable", "Variables are not reassigned in the same scope"),
+    ("shadowed-variable", "Variables don't shadow a variable of an enclosing scope"),
+    ("unused-variable", "Assigned variables are used in the file"),
+])
+
+# Checks done on the summaries of all files after parsing, filled by register_rule
+RULES = {}
+
+
+class RuleContext:
+    def __init__(self, module_dir, module_name, dependencies=()):
+        self.module_dir = module_dir
+        self.module_name = module_name
+        # ModuleExports of the dependencies in the metadata.json of the module
+        self.dependencies = list(dependencies)
+
+
+class Rule:
+    """
+    A validation check, visit is called for every node of the kinds in the kinds list and finish once after all
+    files are visited. finish returns whether errors were found.
+    """
+    name = None
+    description = None
+    kinds = []
+
+    def __init__(self, context):
+        self.context = context
+        self.errors = False
+
+    def visit(self, kind, node):
+        pass
+
+    def finish(self):
+        return self.errors
+
+
+def register_rule(rule):
+    RULES[rule.name] = rule
+    return rule
+
+
+def all_rule_names():
+    return list(PARSER_RULES) + list(RULES)
+
+
+def select_rules(enable=None, disable=None):
+    """
+    Returns the set of disabled rule names, enable lists the only rules to run when given.
+    """
+    names = all_rule_names()
+    unknown = [name for name in (enable or []) + (disable or []) if name not in names]
+    if unknown:
+        raise ValueError("Unknown rules: %s, available rules: %s" % (", ".join(unknown), ", ".join(names)))
+
+    disabled = set(disable or [])
+    if enable:
+        disabled |= set(names) - set(enable)
+    return disabled
+
+
+def read_rule_config(path):
+    """
+    Read the enabled and disabled rules from the [rules] section of a config file, names are comma separated.
+    """
+    config = configparser.ConfigParser()
+    config.read(path)
+
+    def get_names(option):
+        value = config.get("rules", option, fallback="")
+        return [name.strip() for name in value.replace("\n", ",").split(",") if name.strip()]
+
+    return get_names("enable"), get_names("disable")
+
+
+def run_rules(summaries, context, disabled_rules):
+    """
+    Visit all nodes of all summaries once, every node is only passed to the enabled rules for its kind.
+    Returns a list of (rule, errors) and the time spent per rule.
+    """
+    rules = [rule(context) for name, rule in RULES.items() if name not in disabled_rules]
+    dispatch = [(kind, attribute, [r for r in rules if kind in r.kinds]) for kind, attribute in NODE_KINDS.items()]
+    dispatch = [(kind, attribute, handlers) for kind, attribute, handlers in dispatch if handlers]
+    timings = {rule.name: 0.0 for rule in rules}
+
+    for summary in summaries:
+        for kind, attribute, handlers in dispatch:
+            nodes = getattr(summary, attribute)
+            if not nodes:
+                continue
+            for rule in handlers:
+                start = time.perf_counter()
+                for node in nodes:
+                    rule.visit(kind, node)
+                timings[rule.name] += time.perf_counter() - start
+
+    results = []
+    for rule in rules:
+        start = time.perf_counter()
+        results.append((rule, rule.finish()))
+        timings[rule.name] += time.perf_counter() - start
+
+    return results, timings
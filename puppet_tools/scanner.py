@@ -0,0 +1,317 @@
+import hashlib
+import mmap
+import os
+import re
+import traceback
+from bisect import bisect_left
+from collections import namedtuple
+
+from .utility import ParseError, BudgetError
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Comments and quoted strings are matched whole so braces and newlines in them are not seen as structure. Escaped
+# quotes and hashes are consumed first, they never start a string or comment, so an unterminated string is only
+# scanned once and the scan stays linear.
+STRUCTURE_BYTES = re.compile(rb"\\[\\'\"#]|'(?:[^'\\]|\\[\s\S])*'|\"(?:[^\"\\]|\\[\s\S])*\"|#[^\n]*|[{}]")
+STRUCTURE = re.compile(r"\\[\\'\"#]|'(?:[^'\\]|\\[\s\S])*'|\"(?:[^\"\\]|\\[\s\S])*\"|#[^\n]*|[{}]")
+NEWLINE_BYTES = re.compile(rb"\n")
+NEWLINE = re.compile(r"\n")
+
+OPEN_BRACE, CLOSE_BRACE, HASH, SINGLE_QUOTE, DOUBLE_QUOTE, BACKSLASH, NEWLINE_CHAR = \
+    (ord(c) for c in "{}#'\"\\\n")
+
+# braces maps the index of every '{' to the index after its matching '}', balance is the count of '{' minus '}'
+# and lines holds the sorted index of every newline
+Structure = namedtuple("Structure", ["braces", "balance", "lines"])
+
+# deadline is the Deadline the manifest was read and scanned under, None without a time budget
+Manifest = namedtuple("Manifest", ["content", "digest", "structure", "deadline"])
+
+use_numpy = numpy is not None
+# Below this many characters the fixed cost of the NumPy passes is more than the pure Python prescan
+NUMPY_MIN_SIZE = 16384
+# Characters compared at once by find_codes, the boolean masks of the comparisons are this size
+SCAN_CHUNK = 1 << 20
+# Nodes of the path of get_path resolved at once, the pointer jumping holds log2 of it arrays of this size
+PATH_CHUNK = 65536
+
+
+# Maximum size of a file in bytes, 0 is no limit
+max_file_size = 0
+
+
+def set_use_numpy(enabled):
+    global use_numpy
+    use_numpy = enabled and numpy is not None
+
+
+def set_max_file_size(size):
+    global max_file_size
+    max_file_size = size
+
+
+def count_lines(structure, start, end):
+    """
+    Number of newlines in [start, end) of the scanned content.
+    """
+    return bisect_left(structure.lines, end) - bisect_left(structure.lines, start)
+
+
+# Tokens matched by scan_structure between checks of the deadline
+DEADLINE_CHECK_TOKENS = 4096
+
+
+def scan_structure(buffer, pattern=STRUCTURE, deadline=None):
+    """
+    Match the braces of a str or bytes buffer outside of comments and strings, in pure Python.
+    """
+    is_str = pattern is STRUCTURE
+    open_brace = "{" if is_str else b"{"
+    close_brace = "}" if is_str else b"}"
+    newline = NEWLINE if is_str else NEWLINE_BYTES
+    braces = {}
+    stack = []
+    balance = 0
+
+    for count, match in enumerate(pattern.finditer(buffer)):
+        if deadline and count % DEADLINE_CHECK_TOKENS == 0:
+            deadline.check("while scanning")
+        token = match.group()
+        if token == open_brace:
+            stack.append(match.start())
+            balance += 1
+        elif token == close_brace:
+            balance -= 1
+            if stack:
+                braces[stack.pop()] = match.end()
+
+    if deadline:
+        deadline.check("while scanning")
+    lines = [match.start() for match in newline.finditer(buffer)]
+    return Structure(braces, balance, lines)
+
+
+def find_codes(codes, chars):
+    """
+    Sorted indexes of the codes equal to one of chars, compared in chunks of SCAN_CHUNK. The indexes are 32 bit
+    when they fit.
+    """
+    index_type = numpy.int32 if len(codes) < 2 ** 31 else numpy.int64
+    found = [numpy.zeros(0, dtype=index_type)]
+    for start in range(0, len(codes), SCAN_CHUNK):
+        chunk = codes[start:start + SCAN_CHUNK]
+        mask = chunk == chars[0]
+        for char in chars[1:]:
+            mask |= chunk == char
+        found.append((numpy.flatnonzero(mask) + start).astype(index_type))
+    return numpy.concatenate(found)
+
+
+def get_path(following, deadline=None):
+    """
+    Which of the nodes are on the path from node 0, following maps every node to a later node or to the count.
+    The path is followed through chunks of PATH_CHUNK nodes so the arrays of the pointer jumping stay small.
+    """
+    count = len(following)
+    on_path = numpy.zeros(count, dtype=bool)
+    start = 0
+    while start < count:
+        size = min(PATH_CHUNK, count - start)
+        # Nodes of the chunk are numbered from its first node, which is on the path, size is outside of the chunk
+        chunk = numpy.append(numpy.minimum(following[start:start + size] - start, size), size).astype(numpy.int32)
+        depth = numpy.ones(size + 1, dtype=numpy.int32)
+        depth[size] = 0
+
+        # Pointer jumping, jumps[k] moves 2**k nodes along the path
+        jumps = []
+        for _ in range(max(1, size.bit_length())):
+            if deadline:
+                deadline.check("while scanning")
+            jumps.append(chunk)
+            depth = depth + depth[chunk]
+            chunk = chunk[chunk]
+
+        # A node is on the path when jumping from the first node by the difference in depth lands on it
+        steps = depth[0] - depth[:size]
+        landed = numpy.zeros(size, dtype=numpy.int32)
+        for k, jump in enumerate(jumps):
+            landed = numpy.where((steps >> k) & 1 == 1, jump[landed], landed)
+        chunk_path = (steps >= 0) & (landed == numpy.arange(size))
+        on_path[start:start + size] = chunk_path
+
+        # The path leaves the chunk from its last node
+        start = int(following[start + numpy.flatnonzero(chunk_path)[-1]])
+    return on_path
+
+
+def get_masked_spans(codes, candidates, newlines, deadline=None):
+    """
+    Spans [start, end) of the comments and strings opened by the unescaped quotes and hashes in candidates. A quote
+    without a closing quote does not start a string, the same as the regular expression of scan_structure.
+    """
+    count = len(candidates)
+    kinds = codes[candidates]
+    ends = numpy.full(count, -1, dtype=candidates.dtype)
+
+    is_hash = kinds == HASH
+    position = numpy.searchsorted(newlines, candidates[is_hash])
+    newline_ends = numpy.append(newlines, len(codes))
+    ends[is_hash] = newline_ends[position]
+    for char in (SINGLE_QUOTE, DOUBLE_QUOTE):
+        is_quote = kinds == char
+        close = numpy.append(candidates[is_quote], -1)
+        position = numpy.searchsorted(close[:-1], candidates[is_quote], side="right")
+        ends[is_quote] = numpy.where(position < len(close) - 1, close[position] + 1, -1)
+    opens = ends >= 0
+    if deadline:
+        deadline.check("while scanning")
+
+    # Every candidate points to the candidate where scanning continues after it, a quote that opens nothing
+    # continues with the next one. The spans are those of the candidates on the path from the first candidate.
+    following = numpy.where(opens, numpy.searchsorted(candidates, ends), numpy.arange(1, count + 1))
+    on_path = get_path(following, deadline) & opens
+
+    return candidates[on_path], ends[on_path]
+
+
+def get_escaped(codes, candidates):
+    """
+    A quote or hash is escaped when an odd number of backslashes is right before it, only the backslashes are
+    visited.
+    """
+    backslashes = find_codes(codes, (BACKSLASH,))
+    if not len(backslashes):
+        return numpy.zeros(len(candidates), dtype=bool)
+
+    # The first backslash of the run every backslash is part of
+    run_break = numpy.append(True, numpy.diff(backslashes) != 1)
+    run_start = backslashes[numpy.maximum.accumulate(numpy.where(run_break, numpy.arange(len(backslashes)), 0))]
+
+    before = numpy.searchsorted(backslashes, candidates - 1)
+    found = numpy.minimum(before, len(backslashes) - 1)
+    preceded = (before < len(backslashes)) & (backslashes[found] == candidates - 1)
+    return preceded & ((candidates - run_start[found]) % 2 == 1)
+
+
+def scan_structure_numpy(codes, deadline=None):
+    """
+    Match the braces of an array of character codes outside of comments and strings in vectorized passes, gives
+    the same result as scan_structure. The deadline is checked between the passes.
+    """
+    newlines = find_codes(codes, (NEWLINE_CHAR,))
+    candidates = find_codes(codes, (SINGLE_QUOTE, DOUBLE_QUOTE, HASH))
+
+    candidates = candidates[~get_escaped(codes, candidates)]
+    starts, ends = get_masked_spans(codes, candidates, newlines, deadline)
+    if deadline:
+        deadline.check("while scanning")
+
+    # The spans are sorted and don't overlap, a brace is masked when it is before the end of the last span starting
+    # before it
+    brace_positions = find_codes(codes, (OPEN_BRACE, CLOSE_BRACE))
+    span = numpy.searchsorted(starts, brace_positions, side="right") - 1
+    masked = (span >= 0) & (brace_positions < ends[numpy.maximum(span, 0)]) if len(starts) else span >= 0
+    brace_positions = brace_positions[~masked]
+    is_open = codes[brace_positions] == OPEN_BRACE
+    depth = numpy.cumsum(numpy.where(is_open, 1, -1))
+    balance = int(depth[-1]) if len(depth) else 0
+
+    if len(depth) and depth.min() < 0:
+        # A '}' without a '{' is skipped by the stack, the depth levels don't line up anymore
+        braces = match_braces(brace_positions.tolist(), is_open.tolist(), deadline)
+    else:
+        # A '{' opens the level of the depth after it and a '}' closes the level of the depth before it, sorted by
+        # level and position every '}' comes right after its matching '{'
+        level = numpy.where(is_open, depth, depth + 1)
+        order = numpy.lexsort((brace_positions, level))
+        closes = numpy.flatnonzero(~is_open[order])
+        braces = dict(zip(brace_positions[order[closes - 1]].tolist(), (brace_positions[order[closes]] + 1).tolist()))
+
+    return Structure(braces, balance, newlines.tolist())
+
+
+def match_braces(brace_positions, is_open, deadline=None):
+    braces = {}
+    stack = []
+    for count, (position, opening) in enumerate(zip(brace_positions, is_open)):
+        if deadline and count % DEADLINE_CHECK_TOKENS == 0:
+            deadline.check("while scanning")
+        if opening:
+            stack.append(position)
+        elif stack:
+            braces[stack.pop()] = position + 1
+    return braces
+
+
+def get_codes(buffer):
+    """
+    Array of the character codes of a str or bytes-like buffer, the indexes are those of the buffer.
+    """
+    if isinstance(buffer, str):
+        # str.isascii needs Python 3.7, only ascii encodes to one byte per character
+        encoded = buffer.encode("utf-8")
+        if len(encoded) == len(buffer):
+            return numpy.frombuffer(encoded, dtype=numpy.uint8)
+        return numpy.frombuffer(buffer.encode("utf-32-le"), dtype=numpy.uint32)
+    return numpy.frombuffer(buffer, dtype=numpy.uint8)
+
+
+def prescan(buffer, deadline=None):
+    """
+    Structure of a str, or of an ascii bytes-like buffer, with NumPy when it is available and the buffer is large.
+    """
+    try:
+        if use_numpy and len(buffer) >= NUMPY_MIN_SIZE:
+            codes = get_codes(buffer)
+            try:
+                return scan_structure_numpy(codes, deadline)
+            finally:
+                # The array may export the buffer of a mmap, which can't be closed while it is referenced
+                del codes
+        return scan_structure(buffer, STRUCTURE if isinstance(buffer, str) else STRUCTURE_BYTES, deadline)
+    except BudgetError as e:
+        # The arrays and matches in the frames of the traceback reference the buffer as well
+        traceback.clear_frames(e.__traceback__)
+        raise
+
+
+def scan_content(content, deadline=None):
+    return Manifest(content, hashlib.sha256(content.encode("utf-8")).hexdigest(), prescan(content, deadline), deadline)
+
+
+def read_manifest(path, deadline=None):
+    """
+    Memory map a manifest and scan its structure on the bytes, the content is decoded once as UTF-8. Files with '\r'
+    line endings are scanned on the decoded content.
+    The deadline is started before the file is read and is checked while it is scanned.
+    """
+    size = os.path.getsize(path)
+    if max_file_size and size > max_file_size:
+        raise BudgetError("File is %d bytes, more than the budget of %d bytes, skipped" % (size, max_file_size))
+    if size == 0:
+        return scan_content("", deadline)
+
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        digest = hashlib.sha256(buffer).hexdigest()
+        try:
+            content = str(buffer, "utf-8-sig")
+        except UnicodeDecodeError as e:
+            raise ParseError("File is not valid UTF-8 at byte %d" % e.start)
+        if deadline:
+            deadline.check("while reading")
+
+        if buffer.find(b"\r") != -1:
+            # Line endings are converted like a file opened in text mode, the offsets are those of the converted str
+            content = content.replace("\r\n", "\n").replace("\r", "\n")
+            structure = prescan(content, deadline)
+        elif len(content) == len(buffer):
+            # Only ascii, the byte offsets are the same as the str offsets
+            structure = prescan(buffer, deadline)
+        else:
+            structure = prescan(content, deadline)
+
+    return Manifest(content, digest, structure, deadline)
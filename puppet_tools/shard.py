@@ -0,0 +1,84 @@
+import json
+import os
+
+from .summary import summary_to_dict, summary_from_dict
+
+PARTIAL_RESULT_VERSION = 1
+
+
+def parse_shard(value):
+    """
+    Parse a shard argument 'i/N', shards are numbered from 1 to N.
+    """
+    try:
+        index, count = [int(v) for v in value.split("/")]
+    except ValueError:
+        raise ValueError("Shard should be formatted as i/N, found: '%s'" % value)
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError("Shard index should be between 1 and %d, found: '%s'" % (count, value))
+    return index, count
+
+
+def partition_files(paths, count):
+    """
+    Split paths into count partitions with about the same total file size, the result only depends on the paths
+    and their sizes so every node computes the same partitions.
+    """
+    partitions = [[] for _ in range(count)]
+    sizes = [0] * count
+
+    for path in sorted(paths, key=lambda p: (-os.path.getsize(p), p)):
+        smallest = min(range(count), key=lambda i: (sizes[i], i))
+        partitions[smallest].append(path)
+        sizes[smallest] += os.path.getsize(path)
+
+    return [sorted(p) for p in partitions]
+
+
+def write_partial_result(output, shard, module_dir, file_logs, summaries):
+    by_path = {s.path: s for s in summaries}
+    files = []
+    for path, logs in file_logs:
+        summary = by_path.get(path)
+        files.append({
+            "path": os.path.relpath(path, module_dir),
+            "logs": logs,
+            "summary": summary_to_dict(summary, module_dir) if summary else None
+        })
+
+    with open(output, 'w') as f:
+        json.dump({"version": PARTIAL_RESULT_VERSION, "shard": list(shard), "files": files}, f,
+                  separators=(",", ":"))
+
+
+def read_partial_results(paths, module_dir):
+    """
+    Read the partial results of all shards, returns (path, logs, summary) per file ordered by path.
+    """
+    shards = {}
+    files = []
+    count = None
+
+    for path in paths:
+        with open(path, 'r') as f:
+            data = json.load(f)
+        if data.get("version") != PARTIAL_RESULT_VERSION:
+            raise ValueError("Partial result '%s' has unsupported version: %s" % (path, data.get("version")))
+        index, shard_count = data["shard"]
+        if count is not None and shard_count != count:
+            raise ValueError("Partial result '%s' is part of %d shards, expected %d" % (path, shard_count, count))
+        if index in shards:
+            raise ValueError("Shard %d/%d is given twice: '%s' and '%s'" % (index, shard_count, shards[index], path))
+        count = shard_count
+        shards[index] = path
+
+        for item in data["files"]:
+            logs = [(log[0], log[1], tuple(log[2]), log[3], log[4]) for log in item["logs"]]
+            summary = summary_from_dict(item["summary"], module_dir) if item["summary"] else None
+            files.append((os.path.join(module_dir, item["path"]), logs, summary))
+
+    missing = [str(i) for i in range(1, (count or 0) + 1) if i not in shards]
+    if missing:
+        raise ValueError("Missing partial results for shards: " + ", ".join(missing))
+
+    return sorted(files, key=lambda f: f[0])
@@ -0,0 +1,124 @@
+import os
+from collections import namedtuple
+
+from .parser import CASE_COUNTER
+from .puppet_objects.puppet_case_item import PuppetCaseItem
+from .puppet_objects.puppet_chain import PuppetChain
+from .puppet_objects.puppet_class import PuppetClass
+from .puppet_objects.puppet_include import PuppetInclude
+from .puppet_objects.puppet_resource import PuppetResource
+from .puppet_objects.puppet_variable import PuppetVariable
+from .templates import get_template_references
+
+Symbol = namedtuple("Symbol", ["name", "line_number"])
+# A template() or epp() call in the value assigned to a variable
+TemplateCall = namedtuple("TemplateCall", ["variable", "line_number", "file_name", "function", "module", "path"])
+
+
+class PuppetFileSummary:
+    """
+    Compact summary of a parsed puppet file with the definitions, references and positions validation needs,
+    the tree of the file itself can be discarded.
+    """
+    __slots__ = ["path", "name", "digest", "classes", "includes", "case_items", "variables", "resources", "chains",
+                 "template_calls"]
+
+    def __init__(self, path, name, digest=None):
+        self.path = path
+        self.name = name
+        self.digest = digest
+        self.classes = []
+        self.includes = []
+        self.case_items = []
+        self.variables = []
+        self.resources = []
+        self.chains = []
+        self.template_calls = []
+
+    def __repr__(self):
+        return '<PuppetFileSummary: %s, classes: %d, resources: %d>' % (self.name, len(self.classes),
+                                                                        len(self.resources))
+
+
+def summarize(puppet_file):
+    summary = PuppetFileSummary(puppet_file.path, puppet_file.name, puppet_file.digest)
+    stack = list(reversed(puppet_file.items))
+
+    while stack:
+        item = stack.pop()
+        if isinstance(item, PuppetClass):
+            # A declaration includes the class like an include does, it doesn't define it
+            symbols = summary.includes if item.is_declaration else summary.classes
+            symbols.append(Symbol(item.name, item.line_number))
+        elif isinstance(item, PuppetInclude):
+            summary.includes.append(Symbol(item.name, item.line_number))
+        elif isinstance(item, PuppetCaseItem):
+            summary.case_items.append(Symbol(item.name, item.line_number))
+        elif isinstance(item, PuppetVariable):
+            summary.variables.append(Symbol(item.name, item.line_number))
+            if item.value and ("template(" in item.value or "epp(" in item.value):
+                summary.template_calls += [TemplateCall(item.name, item.line_number, puppet_file.name, *reference)
+                                           for reference in get_template_references(item.value)]
+        elif isinstance(item, PuppetResource):
+            summary.resources.append(item)
+            continue
+        elif isinstance(item, PuppetChain):
+            summary.chains.append(item)
+            continue
+        stack.extend(reversed(getattr(item, "items", None) or []))
+
+    return summary
+
+
+def summary_to_dict(summary, module_dir):
+    return {
+        "path": os.path.relpath(summary.path, module_dir),
+        "name": summary.name,
+        "digest": summary.digest,
+        "classes": [list(s) for s in summary.classes],
+        "includes": [list(s) for s in summary.includes],
+        "case_items": [list(s) for s in summary.case_items],
+        "variables": [list(s) for s in summary.variables],
+        "resources": [{
+            "typ": r.typ,
+            "name": r.name,
+            "line_number": r.line_number,
+            "file_name": r.file_name,
+            "items": r.items,
+            "is_dependency": r.is_dependency,
+            "dependency_target": r.dependency_target,
+            "branches": r.branches
+        } for r in summary.resources],
+        "chains": [{
+            "line_number": c.line_number,
+            "file_name": c.file_name,
+            "groups": c.groups
+        } for c in summary.chains],
+        "template_calls": [list(t) for t in summary.template_calls]
+    }
+
+
+def summary_from_dict(data, module_dir):
+    summary = PuppetFileSummary(os.path.join(module_dir, data["path"]), data["name"], data["digest"])
+    summary.classes = [Symbol(*s) for s in data["classes"]]
+    summary.includes = [Symbol(*s) for s in data["includes"]]
+    summary.case_items = [Symbol(*s) for s in data["case_items"]]
+    summary.variables = [Symbol(*s) for s in data["variables"]]
+
+    # Case numbers are only unique within the process that parsed the file, give them new ones
+    case_numbers = {}
+    for r in data["resources"]:
+        resource = PuppetResource(r["typ"], r["line_number"], r["file_name"])
+        resource.name = r["name"]
+        resource.items = r["items"]
+        resource.is_dependency = r["is_dependency"]
+        resource.dependency_target = tuple(r["dependency_target"]) if r["dependency_target"] else None
+        resource.branches = tuple((case_numbers.setdefault(case, next(CASE_COUNTER)), item)
+                                  for case, item in r["branches"])
+        summary.resources.append(resource)
+
+    summary.chains = [PuppetChain(c["line_number"], c["file_name"], [[tuple(key) for key in group]
+                                                                    for group in c["groups"]])
+                      for c in data.get("chains", [])]
+    summary.template_calls = [TemplateCall(*t) for t in data.get("template_calls", [])]
+    return summary
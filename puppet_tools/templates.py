@@ -0,0 +1,139 @@
+import json
+import os
+import re
+
+TEMPLATE_CALL = re.compile(r"\b(template|epp)\(\s*['\"]([^'\"]+)['\"]")
+TEMPLATE_TAG = re.compile(r"<%(?!%)(.*?)%>", re.DOTALL)
+ERB_VARIABLE = re.compile(r"@([a-z_][a-zA-Z0-9_]*)")
+# A variable in an epp tag, with the namespace of a class variable like $app::port
+EPP_VARIABLE = re.compile(r"\$(?:::)?(?:[a-z][a-z0-9_]*::)*([a-z_][a-zA-Z0-9_]*)")
+# Parameters of the template or of a lambda, between pipes
+EPP_PARAMETERS = re.compile(r"\|([^|]*)\|")
+EPP_ASSIGNMENT = re.compile(r"\$([a-z_][a-zA-Z0-9_]*)\s*=(?![=~>])")
+# Variables every epp template can use
+EPP_BUILTIN_VARIABLES = {"facts", "trusted", "server_facts", "settings"}
+
+# File in the cache directory the results of scan_template are kept in between runs
+TEMPLATE_CACHE_FILE = "templates.json"
+TEMPLATE_CACHE_VERSION = 3
+
+# Directory of the cache between runs, None keeps the results only in this process
+cache_dir = None
+# absolute path -> ((mtime, size), result of scan_template)
+scan_cache = {}
+scan_cache_changed = False
+
+
+def get_template_references(value):
+    """
+    Returns (function, module, path) for every template() and epp() call in a value.
+    """
+    references = []
+    for function, reference in TEMPLATE_CALL.findall(value):
+        module, _, path = reference.partition("/")
+        references.append((function, module, path))
+    return references
+
+
+class TemplateIndex:
+    """
+    Paths of all files in the templates directory of a module, the directory is only listed on the first lookup.
+    """
+
+    def __init__(self, module_dir):
+        self.templates_dir = os.path.join(module_dir, "templates")
+        self.paths = None
+
+    def find(self, path):
+        if self.paths is None:
+            self.paths = {}
+            for root, _, files in os.walk(self.templates_dir):
+                for f in files:
+                    full_path = os.path.join(root, f)
+                    self.paths[os.path.relpath(full_path, self.templates_dir).replace(os.sep, "/")] = full_path
+        return self.paths.get(path)
+
+
+def scan_template(path):
+    """
+    Returns (unclosed tags, variables) of a template, the @variables of an erb template or the $variables of an epp
+    template which are not its parameters or assigned in it. Results are cached until the modification time or size
+    of the file changes.
+    """
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    # A copy which keeps the modification time may still change the size
+    key = (stat.st_mtime, stat.st_size)
+    cached = scan_cache.get(path)
+    if cached and cached[0] == key:
+        return cached[1]
+
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        content = f.read()
+
+    unclosed = content.count("<%") - content.count("<%%") - (content.count("%>") - content.count("%%>"))
+    variables = set()
+    if path.endswith(".erb"):
+        for tag in TEMPLATE_TAG.findall(content):
+            variables.update(ERB_VARIABLE.findall(tag))
+    elif path.endswith(".epp"):
+        local = set(EPP_BUILTIN_VARIABLES)
+        for tag in TEMPLATE_TAG.findall(content):
+            for parameters in EPP_PARAMETERS.findall(tag):
+                local.update(EPP_VARIABLE.findall(parameters))
+            local.update(EPP_ASSIGNMENT.findall(tag))
+            variables.update(EPP_VARIABLE.findall(EPP_PARAMETERS.sub("", tag)))
+        variables -= local
+
+    global scan_cache_changed
+    result = (unclosed, variables)
+    scan_cache[path] = (key, result)
+    scan_cache_changed = True
+    return result
+
+
+def set_cache_dir(directory):
+    global cache_dir
+    cache_dir = directory
+
+
+def get_cache_file():
+    return os.path.join(cache_dir, TEMPLATE_CACHE_FILE) if cache_dir else None
+
+
+def load_scan_cache():
+    """
+    Read the results of earlier runs from the cache directory into scan_cache, a missing or unreadable cache is
+    ignored.
+    """
+    cache_file = get_cache_file()
+    if not cache_file:
+        return
+    try:
+        with open(cache_file, 'r') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return
+    if data.get("version") != TEMPLATE_CACHE_VERSION:
+        return
+    for path, (mtime, size, unclosed, variables) in data["templates"].items():
+        scan_cache.setdefault(path, ((mtime, size), (unclosed, set(variables))))
+
+
+def save_scan_cache():
+    """
+    Write scan_cache to the cache directory when templates were scanned, the entries of deleted templates are dropped.
+    """
+    global scan_cache_changed
+    cache_file = get_cache_file()
+    if not cache_file or not scan_cache_changed:
+        return
+    templates = {path: [mtime, size, unclosed, sorted(variables)]
+                 for path, ((mtime, size), (unclosed, variables)) in scan_cache.items() if os.path.isfile(path)}
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(cache_file, 'w') as f:
+            json.dump({"version": TEMPLATE_CACHE_VERSION, "templates": templates}, f, separators=(",", ":"))
+    except OSError:
+        return
+    scan_cache_changed = False
@@ -1,15 +1,62 @@
 import os
 import re
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
-from .constants import LOG_MESSAGES, CheckRegex, check_regex_list, LOG_TYPE_ERROR
+from .constants import LOG_MESSAGES, CheckRegex, check_regex_list, LOG_TYPE_ERROR, CHECK_RULE_NAMES
 
 log_list = []
+disabled_rules = set()
+char_patterns = {}
+
+
+class ParseError(Exception):
+    pass
+
+
+class BudgetError(ParseError):
+    """
+    A file is over the size or time budget of a file, it is skipped as a whole.
+    """
+    pass
+
+
+class Deadline:
+    """
+    Wall time budget to read, scan and walk one file, check raises a BudgetError once it is spent.
+    """
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.end = time.monotonic() + seconds
+        self.remaining = seconds
+
+    def check(self, where):
+        if time.monotonic() > self.end:
+            raise BudgetError("Parsing took more than the budget of %g seconds %s, skipped" % (self.seconds, where))
+
+    def pause(self):
+        """
+        Stop the clock while a file read ahead waits to be walked, resume starts it again.
+        """
+        self.remaining = self.end - time.monotonic()
+
+    def resume(self):
+        self.end = time.monotonic() + self.remaining
 
 
 class ParseHelper:
-    def __init__(self, content, index):
+    """
+    Walks over the span [index, end) of content without copying it, braces maps every '{' to the index after
+    its matching '}'.
+    """
+
+    def __init__(self, content, index, braces, end=None):
         self.content = content
         self.ind = index
+        self.braces = braces
+        self.end = len(content) if end is None else end
         self.results_list = []
         self.index_save = {}
 
@@ -22,19 +69,17 @@ class ParseHelper:
         return self
 
     def until(self, chars, save=False):
-        if type(chars) == str:
-            chars = [chars]
-        res, size = get_until(self.content[self.ind:], chars)
-        self.ind += size
+        res, self.ind = get_until(self.content, chars, self.ind, self.end)
         if save:
             self.results_list.append(res)
         return self
 
-    def get_content_till_end_brace(self, override_index=None):
-        ind = get_matching_end_brace(self.content, self.index_save[override_index] if override_index else self.ind)
-        c = self.content[self.ind:ind]
-        self.ind += ind - self.ind
-        return c, count_newlines(c)
+    def get_span_till_end_brace(self, override_index=None):
+        start = self.index_save[override_index] if override_index else self.ind
+        end = get_matching_end_brace(self.content, start, self.braces)
+        span = (self.ind, end)
+        self.ind = end
+        return span
 
     def save_index(self, name: str):
         self.index_save[name] = self.ind
@@ -47,11 +92,6 @@ class ParseHelper:
         return self.ind
 
 
-def strip_comments(code):
-    code = str(code)
-    return re.sub(r'(?m)^ *#.*\n?', '\n', code)
-
-
 def add_log(file_name, typ, line_col, message, string):
     global log_list
     log_list.append((file_name, typ, line_col, message, string))
@@ -70,15 +110,41 @@ def get_logs():
     return log_list
 
 
+def set_disabled_rules(rules):
+    global disabled_rules
+    disabled_rules = set(rules)
+
+
+def get_disabled_rules():
+    return disabled_rules
+
+
+def rule_enabled(name):
+    return name not in disabled_rules
+
+
 def check_regex(string, line_col, file, regex_check_name: CheckRegex, disable_log=False):
     pattern = check_regex_list[regex_check_name]
     success = bool(pattern.match(string))
-    if not success and not disable_log:
+    if not success and not disable_log and rule_enabled(CHECK_RULE_NAMES[regex_check_name]):
         log_type, message = LOG_MESSAGES[regex_check_name]
         add_log(file.name, log_type, line_col, message, string)
     return success
 
 
+def check_regex_at(content, start, end, line_col, file, regex_check_name: CheckRegex, disable_log=False):
+    """
+    check_regex on the line starting at start, without copying the rest of the content.
+    """
+    line_end = get_line_end(content, start, end)
+    pattern = check_regex_list[regex_check_name]
+    success = bool(pattern.match(content, start, line_end))
+    if not success and not disable_log and rule_enabled(CHECK_RULE_NAMES[regex_check_name]):
+        log_type, message = LOG_MESSAGES[regex_check_name]
+        add_log(file.name, log_type, line_col, message, content[start:line_end])
+    return success
+
+
 def get_all_files(path, include_dirs=False):
     path = os.path.normpath(path)
     path = os.path.abspath(path)
@@ -93,60 +159,76 @@ def get_all_files(path, include_dirs=False):
 
 
 def get_file_contents(path):
-    with open(path, 'r') as f:
+    with open(path, 'r', encoding='utf-8') as f:
         return f.read()
 
 
-def find_next_char(content, chars):
-    index = 0
-
-    while content[index] not in chars:
-        index += 1
+def prefetch_file_contents(paths, workers=4, queue_size=8, reader=get_file_contents):
+    """
+    Yield (path, content, error) for every path in order while a small thread pool reads ahead with reader.
+
+    At most queue_size files are read but not yet consumed, this keeps the memory bounded.
+    """
+    queue_size = max(queue_size, 1)
+    paths = iter(paths)
+    pending = deque()
+
+    def submit_next(pool):
+        for path in paths:
+            pending.append((path, pool.submit(reader, path)))
+            return
+
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+        for _ in range(queue_size):
+            submit_next(pool)
+
+        while pending:
+            path, future = pending.popleft()
+            try:
+                content, error = future.result(), None
+            except Exception as e:
+                content, error = None, e
+            submit_next(pool)
+            yield path, content, error
+
+
+def find_next_char(content, chars, start=0, end=None):
+    """
+    Index of the first of chars in content[start:end], end when none of them is found.
+    """
+    end = len(content) if end is None else end
+    pattern = char_patterns.get(chars)
+    if not pattern:
+        pattern = char_patterns[chars] = re.compile("[" + re.escape("".join(chars)) + "]")
+    match = pattern.search(content, start, end)
+    return match.start() if match else end
+
+
+def find_next_string(content, string, start=0, end=None):
+    end = len(content) if end is None else end
+    index = content.find(string, start, end)
+    return end if index == -1 else index
+
+
+def get_until(content, chars=None, start=0, end=None, string=None):
+    """
+    Returns the text from start until the first of chars (or string) and the index it was found at.
+    """
+    if chars:
+        index = find_next_char(content, tuple(chars), start, end)
+    else:
+        index = find_next_string(content, string, start, end)
 
-    return index
+    return content[start:index], index
 
 
-def find_next_string(content, string):
-    index = 0
-    while content[index:index + len(string)] != string:
-        index += 1
-    return index
+def get_line_end(content, start, end=None):
+    return find_next_string(content, "\n", start, end)
 
 
-def get_until(content, chars=None, string=None, or_char=None):
-    size = 0
-    if type(chars) == str:
-        chars = [chars, or_char]
-    if chars:
-        size = find_next_char(content, chars)
-    elif string:
-        size = find_next_string(content, string)
-
-    return content[:size], size
-
-
-def brace_count_verify(content):
-    return content.count('{') - content.count('}')
-
-
-def get_matching_end_brace(content, index):
-    if content[index] != '{':
-        raise Exception("char is not a {, found: '%s'" % content[index])
-    counter = 0
-    end_brace_found = False
-    try:
-        while counter != 0 or not end_brace_found:
-            if content[index] == '{':
-                counter += 1
-            if content[index] == '}':
-                counter -= 1
-                end_brace_found = True
-            index += 1
-    except IndexError as e:
-        print(counter, end_brace_found)
-        raise IndexError(str(e) + ": " + str(counter) + " " + str(end_brace_found))
-    return index
-
-
-def count_newlines(content):
-    return len(content.split('\n'))
+def get_matching_end_brace(content, index, braces):
+    if content[index:index + 1] != '{':
+        raise ParseError("char is not a {, found: '%s'" % content[index:index + 1])
+    if index not in braces:
+        raise ParseError("no matching end brace for the brace at index %d" % index)
+    return braces[index]
@@ -2,31 +2,14 @@ import os
 
 from termcolor import colored
 
-from .puppet_objects import PuppetObject
-from .puppet_objects.puppet_case_item import PuppetCaseItem
-from .puppet_objects.puppet_class import PuppetClass
-from .puppet_objects.puppet_include import PuppetInclude
+from .puppet_objects.puppet_chain import PuppetChain
 from .puppet_objects.puppet_resource import PuppetResource
-from .puppet_objects.puppet_variable import PuppetVariable
-from .constants import LOG_TYPE_ERROR, SPLIT_TOKEN, LOG_TYPE_WARNING, LOG_TYPE_DEBUG
-from .utility import add_log
-
-
-def sort_puppet_objects(puppet_object, results=None, index_list=None):
-    if index_list is None:
-        index_list = []
-    if results is None:
-        results = {}
-
-    if isinstance(puppet_object, PuppetObject):
-        if puppet_object.items:
-            for i, it in enumerate(puppet_object.items):
-                index_list.append(i)
-                if type(it) not in results:
-                    results[type(it)] = []
-                results[type(it)].append((index_list, it))
-                results = sort_puppet_objects(it, results, index_list)
-    return results
+from .constants import LOG_TYPE_ERROR, SPLIT_TOKEN, LOG_TYPE_WARNING, LOG_TYPE_DEBUG, LOG_TYPE_INFO
+from .dependency_graph import DependencyGraph, resource_keys
+from .exports import load_dependency_exports, find_exported_class, find_exported_resource
+from .rules import Rule, RuleContext, register_rule, run_rules
+from .templates import TemplateIndex, get_template_references, scan_template, load_scan_cache, save_scan_cache
+from .utility import add_log, get_disabled_rules
 
 
 def find_base_class(classes):
@@ -35,88 +18,239 @@ def find_base_class(classes):
             return i, c
 
 
-def validate_puppet_module(puppet_files, module_dir):
+def validate_puppet_module(summaries, module_dir, rule_timing=False, modulepath=None):
     print("\nValidating...")
-    file_results = [sort_puppet_objects(f) for f in puppet_files]
 
     def get_type(t):
-        return [r[1] for result in file_results if t in result for r in result[t]]
+        return [item for summary in summaries for item in getattr(summary, t)]
 
     def get_resource_type(t):
-        return [r for r in get_type(PuppetResource) if r.typ == t]
+        return [r for r in get_type("resources") if r.typ == t]
 
-    classes = get_type(PuppetClass)
-    includes = get_type(PuppetInclude)
-    case_items = get_type(PuppetCaseItem)
+    classes = get_type("classes")
+    case_items = get_type("case_items")
     packages = get_resource_type("package")
     services = get_resource_type("service")
     cron = get_resource_type("cron")
     files = get_resource_type("file")
     execs = get_resource_type("exec")
-    variables = get_type(PuppetVariable)
+    variables = get_type("variables")
 
     class_names = [c.name for c in classes]
     module_name = class_names[0].split("::")[0]
 
-    for cl in classes:
-        if module_name not in cl.name:
-            add_log(module_name, LOG_TYPE_WARNING, (0, 0),
-                    "Please check the provided module name and/or classes, the module name should be in the class "
-                    "names, found: '%s' while should start with '%s'" % (cl.name, module_name), "")
-
     # Summary
     print()
     print("Module '%s' Content Summary:" % module_name)
-    print("Classes:\t", ", ".join(list(set(c.name for c in classes))))
-    print("Case items:\t", ", ".join(list(set(c.name for c in case_items))))
-    print("Packages:\t", ", ".join(list(set(p.name for p in packages))))
-    print("Execs:\t\t", ", ".join(list(set(e.name for e in execs))))
-    print("Services:\t", ", ".join(list(set(s.name for s in services))))
-    print("Cron:\t\t", ", ".join(list(set(c.name for c in cron))))
-    print("Files:\t\t", ", ".join(list(set(f.name for f in files))))
-    print("Variables:\t", ", ".join(list(set(v.name for v in variables))))
+    print("Classes:\t", ", ".join(sorted(set(c.name for c in classes))))
+    print("Case items:\t", ", ".join(sorted(set(c.name for c in case_items))))
+    print("Packages:\t", ", ".join(sorted(set(p.name for p in packages))))
+    print("Execs:\t\t", ", ".join(sorted(set(e.name for e in execs))))
+    print("Services:\t", ", ".join(sorted(set(s.name for s in services))))
+    print("Cron:\t\t", ", ".join(sorted(set(c.name for c in cron))))
+    print("Files:\t\t", ", ".join(sorted(set(f.name for f in files))))
+    print("Variables:\t", ", ".join(sorted(set(v.name for v in variables))))
+
+    dependencies = load_dependencies(module_dir, module_name, modulepath)
+    print("Dependencies:\t", ", ".join(sorted(d.module for d in dependencies)))
     print()
 
     print("Starting validation of puppet objects:")
 
-    # Verify all includes have a corresponding class to include.
-    verify(verify_includes, {"includes": includes, "classes": classes, "module_name": module_name},
-           "All includes have a corresponding class to include")
+    results, timings = run_rules(summaries, RuleContext(module_dir, module_name, dependencies),
+                                 get_disabled_rules())
+    for rule, errors in results:
+        print(colored(("️❌" if errors else "✔") + " Verified " + rule.description, "red" if errors else "green"))
+
+    if rule_timing:
+        print()
+        print("Rule timings:")
+        for name, seconds in timings.items():
+            print("%s:\t%f seconds" % (name, seconds))
+
+
+def load_dependencies(module_dir, module_name, modulepath=None):
+    """
+    Load the exports of the dependencies of the module, by default the modulepath is the directory of the module.
+    """
+    if modulepath is None:
+        modulepath = [os.path.dirname(os.path.abspath(module_dir))]
+    try:
+        dependencies, missing = load_dependency_exports(module_dir, modulepath)
+    except ValueError as e:
+        add_log(module_name, LOG_TYPE_WARNING, (0, 0), "Exports of the dependencies can't be loaded: %s" % e, "")
+        return []
+
+    for name in missing:
+        add_log(module_name, LOG_TYPE_INFO, (0, 0),
+                "Dependency '%s' has no exports in the modulepath, references to it can't be resolved" % name, "")
+    return dependencies
+
+
+@register_rule
+class ModuleNameRule(Rule):
+    name = "module-name"
+    description = "All classes are named after the module"
+    kinds = ["class"]
+
+    def visit(self, kind, node):
+        module_name = self.context.module_name
+        if module_name not in node.name:
+            add_log(module_name, LOG_TYPE_WARNING, (0, 0),
+                    "Please check the provided module name and/or classes, the module name should be in the class "
+                    "names, found: '%s' while should start with '%s'" % (node.name, module_name), "")
+
+
+@register_rule
+class IncludesRule(Rule):
+    name = "includes"
+    description = "All includes have a corresponding class to include"
+    kinds = ["class", "include"]
+
+    def __init__(self, context):
+        super().__init__(context)
+        self.includes = []
+        self.class_names = set()
+
+    def visit(self, kind, node):
+        if kind == "class":
+            self.class_names.add(node.name)
+        else:
+            self.includes.append(node)
+
+    def finish(self):
+        return verify_includes(self.includes, self.class_names, self.context.module_name,
+                               self.context.dependencies)
+
+
+@register_rule
+class ResourceItemsRule(Rule):
+    name = "resource-items"
+    description = "All resources have valid items"
+    kinds = ["resource"]
+
+    def visit(self, kind, node):
+        if verify_resource_items([node]):
+            self.errors = True
+
+
+class ResourceListRule(Rule):
+    """
+    Rule that checks all resources of the module at once after they are collected.
+    """
+    kinds = ["resource"]
+
+    def __init__(self, context):
+        super().__init__(context)
+        self.resources = []
+
+    def visit(self, kind, node):
+        self.resources.append(node)
+
+
+@register_rule
+class ResourceReferencesRule(ResourceListRule):
+    name = "resource-references"
+    description = "All resources have valid references"
+
+    def finish(self):
+        def get_resource_type(t):
+            return [r for r in self.resources if r.typ == t]
+
+        return verify_resource_item_references(self.resources, get_resource_type("service"), get_resource_type("file"),
+                                               get_resource_type("exec"), get_resource_type("package"),
+                                               self.context.dependencies)
+
+
+@register_rule
+class ResourceFileSourcesRule(Rule):
+    name = "file-sources"
+    description = "All resource file sources are available in the module"
+    kinds = ["resource"]
+
+    def __init__(self, context):
+        super().__init__(context)
+        self.files = []
 
-    # Verify all resource items
-    verify(verify_resource_items, {"resources": get_type(PuppetResource)},
-           "All resources have valid references")
+    def visit(self, kind, node):
+        if node.typ == "file":
+            self.files.append(node)
 
-    # Verify all resource item references
-    verify(verify_resource_item_references, {
-        "resources": get_type(PuppetResource),
-        "services": services,
-        "execs": execs,
-        "packages": packages,
-        "files": files
-    }, "All resources have valid items")
+    def finish(self):
+        return verify_resource_file_sources(self.context.module_dir, self.files, self.context.module_name)
 
-    # Verify all files exist in the module files directory.
-    verify(verify_resource_file_sources, {"module_dir": module_dir,
-                                          "file_resource_sources": get_resource_type("file"),
-                                          "module_name": module_name},
-           "All resource file sources are available in the module")
 
+@register_rule
+class DuplicateResourcesRule(ResourceListRule):
+    name = "duplicate-resources"
+    description = "All resources are declared once"
 
-def verify(method, args, name):
-    errors = method(**args)
-    print(colored(("️❌" if errors else "✔") + " Verified " + name, "red" if errors else "green"))
+    def finish(self):
+        return verify_duplicate_resources(self.resources)
 
 
-def verify_includes(includes, classes, module_name):
+@register_rule
+class ResourceDependenciesRule(ResourceListRule):
+    name = "dependency-cycles"
+    description = "All resource dependencies are free of cycles"
+    kinds = ["resource", "chain", "class"]
+
+    def __init__(self, context):
+        super().__init__(context)
+        self.chains = []
+        self.class_names = set()
+
+    def visit(self, kind, node):
+        if kind == "resource":
+            self.resources.append(node)
+        elif kind == "chain":
+            self.chains.append(node)
+        else:
+            self.class_names.add(node.name)
+
+    def finish(self):
+        return verify_resource_dependencies(self.resources, self.context.dependencies, self.chains, self.class_names)
+
+
+@register_rule
+class TemplatesRule(Rule):
+    name = "templates"
+    description = "All referenced templates are available in the module"
+    kinds = ["resource", "variable", "template_call"]
+
+    def __init__(self, context):
+        super().__init__(context)
+        self.references = []
+        self.variable_names = set()
+
+    def visit(self, kind, node):
+        if kind == "variable":
+            self.variable_names.add(node.name)
+        elif kind == "template_call":
+            self.references.append(("Variable '$%s'" % node.variable, node.file_name, node.line_number,
+                                    "$%s = %s('%s/%s')" % (node.variable, node.function, node.module, node.path),
+                                    (node.function, node.module, node.path)))
+        else:
+            for item in node.items:
+                if "template(" in item or "epp(" in item:
+                    self.references += [("Resource %s '%s'" % (node.typ, node.name), node.file_name,
+                                         node.line_number, str(node), reference)
+                                        for reference in get_template_references(item)]
+
+    def finish(self):
+        load_scan_cache()
+        errors = verify_templates(self.references, TemplateIndex(self.context.module_dir), self.variable_names,
+                                  self.context.module_name)
+        save_scan_cache()
+        return errors
+
+
+def verify_includes(includes, class_names, module_name, dependencies=()):
     errors = False
     for i in includes:
-        for c in classes:
-            if i.name == c.name:
-                break
-        else:
+        if i.name not in class_names and not find_exported_class(dependencies, i.name):
             add_log(module_name, LOG_TYPE_ERROR, (0, 0),
-                    "There was an include for %s but no class in the module" % i, "")
+                    "There was an include for %s but no class in the module" % i.name, "")
             errors = True
     return errors
 
@@ -175,7 +309,7 @@ def find_any_path(resources, search_path):
     return False
 
 
-def verify_resource_item_references(resources, services, files, execs, packages):
+def verify_resource_item_references(resources, services, files, execs, packages, dependencies=()):
     errors = False
 
     service_names = [s.name for s in services]
@@ -190,7 +324,8 @@ def verify_resource_item_references(resources, services, files, execs, packages)
 
             if value.startswith("Service"):
                 service_name = value.replace("Service['", "").replace("']", "")
-                if service_name not in service_names:
+                if service_name not in service_names and \
+                        not find_exported_resource(dependencies, ("service", service_name)):
                     add_log(
                         r.file_name, LOG_TYPE_WARNING, (r.line_number, 0),
                         "Resource %s '%s' has a reference to Service '%s' but couldn't be found, may exist in parent "
@@ -198,21 +333,24 @@ def verify_resource_item_references(resources, services, files, execs, packages)
             elif value.startswith("File"):
                 file_name = value.replace("File['", "").replace("']", "")
 
-                if file_name not in file_names and not find_any_path(files, file_name):
+                if file_name not in file_names and not find_any_path(files, file_name) and \
+                        not find_exported_resource(dependencies, ("file", file_name)):
                     add_log(
                         r.file_name, LOG_TYPE_WARNING, (r.line_number, 0),
                         "Resource %s '%s' has a reference to File '%s' but couldn't be found, may exist in parent "
                         "module" % (r.typ, r.name, file_name), str(r))
             elif value.startswith("Exec"):
                 exec_name = value.replace("Exec['", "").replace("']", "")
-                if exec_name not in exec_names:
+                if exec_name not in exec_names and \
+                        not find_exported_resource(dependencies, ("exec", exec_name)):
                     add_log(
                         r.file_name, LOG_TYPE_WARNING, (r.line_number, 0),
                         "Resource %s '%s' has a reference to Exec '%s' but couldn't be found, may exist in parent "
                         "module" % (r.typ, r.name, exec_name), str(r))
             elif value.startswith("Package"):
                 package_name = value.replace("Package['", "").replace("']", "")
-                if package_name not in package_names:
+                if package_name not in package_names and \
+                        not find_exported_resource(dependencies, ("package", package_name)):
                     add_log(
                         r.file_name, LOG_TYPE_WARNING, (r.line_number, 0),
                         "Resource %s '%s' has a reference to Package '%s' but couldn't be found, may exist in parent "
@@ -220,9 +358,8 @@ def verify_resource_item_references(resources, services, files, execs, packages)
             elif value.startswith("Stage"):
                 add_log(r.file_name, LOG_TYPE_DEBUG, (r.line_number, 0), "Not Implemented Stage['.*']", str(r))
                 pass  # TODO: Implement? what is it?
-            elif value.startswith("template"):
-                add_log(r.file_name, LOG_TYPE_DEBUG, (r.line_number, 0), "Not Implemented template['.*']", str(r))
-                pass  # TODO: Implement template validation
+            elif value.startswith("template") or value.startswith("epp"):
+                pass  # Checked by the templates rule
             elif value.startswith("'"):
                 pass
             elif value == "file":
@@ -261,3 +398,137 @@ def verify_resource_file_sources(module_dir, file_resource_sources, module_name)
                     errors = True
                     break
     return errors
+
+
+def verify_resource_dependencies(resources, dependencies=(), chains=(), class_names=()):
+    graph = DependencyGraph(resources, chains, class_names)
+
+    for r, parameter, (typ, title) in graph.dangling:
+        if find_exported_resource(dependencies, (typ, title)) or \
+                (typ == "class" and find_exported_class(dependencies, title.lstrip(":"))):
+            continue
+        if isinstance(r, PuppetChain):
+            add_log(r.file_name, LOG_TYPE_INFO, (r.line_number, 0),
+                    "Chain references %s['%s'] which is not in the module" % (typ.capitalize(), title), str(r))
+        else:
+            add_log(r.file_name, LOG_TYPE_INFO, (r.line_number, 0),
+                    "Resource %s '%s' %s %s['%s'] which is not in the module" % (r.typ, r.name, parameter,
+                                                                                 typ.capitalize(), title), str(r))
+
+    cycles = graph.cycles()
+    for cycle in cycles:
+        cycle_resources = [graph.resources[node] for node in cycle]
+        first = cycle_resources[0]
+        add_log(first.file_name, LOG_TYPE_ERROR, (first.line_number, 0),
+                "Dependency cycle between resources: " +
+                " -> ".join("%s['%s'] (%s:%d)" % (r.typ.capitalize(), r.name, r.file_name, r.line_number)
+                            for r in cycle_resources), str(first))
+    return bool(cycles)
+
+
+class BranchNode:
+    """
+    Declarations of one resource key below a path of (case, item) branches. first is the earliest (order, resource)
+    in or below the node, declared the earliest declared at the node itself, cases maps every case below the node to
+    {item: BranchNode} and first_cases holds (case, first) of the first two cases declared in.
+    """
+    __slots__ = ["first", "declared", "cases", "first_cases"]
+
+    def __init__(self):
+        self.first = None
+        self.declared = None
+        self.cases = {}
+        self.first_cases = []
+
+    def find_duplicate(self, branches):
+        """
+        Earliest declaration which is not exclusive with a declaration at branches. Two declarations are exclusive
+        when their paths first differ in the item of the same case, so only that case is followed down.
+        """
+        found = []
+        node = self
+        for case, item in branches:
+            if node.declared:
+                found.append(node.declared)
+            # Every case after the first two has its first declaration after theirs
+            other = next((first for other_case, first in node.first_cases if other_case != case), None)
+            if other:
+                found.append(other)
+            node = node.cases.get(case, {}).get(item)
+            if node is None:
+                break
+        else:
+            if node.first:
+                found.append(node.first)
+        return min(found, key=lambda declaration: declaration[0])[1] if found else None
+
+    def add(self, branches, declaration):
+        node = self
+        for case, item in branches:
+            node.first = node.first or declaration
+            if case not in node.cases:
+                node.cases[case] = {}
+                if len(node.first_cases) < 2:
+                    node.first_cases.append((case, declaration))
+            node = node.cases[case].setdefault(item, BranchNode())
+        node.first = node.first or declaration
+        node.declared = node.declared or declaration
+
+
+def verify_duplicate_resources(resources):
+    errors = False
+    declarations = {}
+
+    for order, r in enumerate(resources):
+        duplicate = None
+        for key in set(resource_keys(r)):
+            tree = declarations.setdefault(key, BranchNode())
+            if not duplicate:
+                duplicate = tree.find_duplicate(r.branches)
+            tree.add(r.branches, (order, r))
+
+        if duplicate:
+            add_log(r.file_name, LOG_TYPE_ERROR, (r.line_number, 0),
+                    "Duplicate declaration: %s['%s'] (%s:%d) is already declared as %s['%s'] (%s:%d)" % (
+                        r.typ.capitalize(), r.name, r.file_name, r.line_number, duplicate.typ.capitalize(),
+                        duplicate.name, duplicate.file_name, duplicate.line_number), str(r))
+            errors = True
+    return errors
+
+
+def verify_templates(references, template_index, variable_names, module_name):
+    """
+    Check the (user, file name, line number, string, (function, module, path)) template references of resources
+    and variables.
+    """
+    errors = False
+    checked = set()
+
+    for user, file_name, line_number, string, (function, module, path) in references:
+        if module != module_name:
+            add_log(file_name, LOG_TYPE_DEBUG, (line_number, 0),
+                    "%s uses %s '%s/%s' of another module" % (user, function, module, path), string)
+            continue
+
+        template_path = template_index.find(path)
+        if not template_path:
+            add_log(file_name, LOG_TYPE_ERROR, (line_number, 0),
+                    "%s uses non existing %s '%s/%s'" % (user, function, module, path), string)
+            errors = True
+            continue
+
+        if template_path in checked:
+            continue
+        checked.add(template_path)
+
+        unclosed, template_variables = scan_template(template_path)
+        if unclosed:
+            add_log(module_name, LOG_TYPE_ERROR, (0, 0),
+                    "Template '%s/%s' has %d unbalanced '<%%' and '%%>' tags" % (module, path, abs(unclosed)), "")
+            errors = True
+        sigil = "$" if path.endswith(".epp") else "@"
+        for name in sorted(template_variables - variable_names):
+            add_log(module_name, LOG_TYPE_INFO, (0, 0),
+                    "Template '%s/%s' uses '%s%s' which is not assigned in the module, may be a class parameter or "
+                    "fact" % (module, path, sigil, name), "")
+    return errors
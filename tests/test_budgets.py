@@ -0,0 +1,53 @@
+import time
+
+import pytest
+
+from puppet_tools import parser, scanner
+from puppet_tools.main import process_file, read_ahead_manifest
+from puppet_tools.puppet_objects.puppet_file import PuppetFile
+from puppet_tools.utility import BudgetError, Deadline, clear_logs
+
+
+class ScanDeadline(Deadline):
+    """
+    Deadline which is only spent once the scan has started.
+    """
+
+    def check(self, where):
+        if where == "while scanning":
+            raise BudgetError("Over the budget " + where)
+
+
+@pytest.mark.parametrize("use_numpy", [True, False])
+def test_budget_while_scanning_a_mapped_file(tmp_path, monkeypatch, use_numpy):
+    monkeypatch.setattr(scanner, "use_numpy", use_numpy and scanner.numpy is not None)
+    path = tmp_path / "big.pp"
+    path.write_text("class c {\n" + "  file { '/f': ensure => file, }\n" * 2000 + "}\n")
+    with pytest.raises(BudgetError, match="while scanning"):
+        scanner.read_manifest(str(path), ScanDeadline(1))
+
+
+def test_budget_inside_a_huge_resource(monkeypatch):
+    monkeypatch.setattr(parser, "DEADLINE_CHECK_INTERVAL", 1024)
+    content = "  file { 'f':\n" + "    ensure => file,\n" * 2000 + "  }\n"
+    puppet_file = PuppetFile("huge.pp")
+    clear_logs()
+    with pytest.raises(BudgetError, match="at line 53"):
+        parser.walk_resource(content, (0, len(content)), "file", 1, puppet_file, puppet_file.scope, Deadline(-1))
+    clear_logs()
+
+
+def test_read_ahead_manifest_keeps_its_deadline(tmp_path, monkeypatch):
+    monkeypatch.setattr(parser, "max_parse_time", 0.2)
+    path = tmp_path / "init.pp"
+    path.write_text("class c {\n  file { '/f':\n    ensure => file,\n  }\n}\n")
+    manifest = read_ahead_manifest(str(path))
+    # Waiting to be walked doesn't count, the time spent reading and scanning does
+    time.sleep(0.3)
+    clear_logs()
+    process_file(str(path), manifest)
+
+    manifest.deadline.remaining = -1
+    with pytest.raises(BudgetError, match="at line 1"):
+        process_file(str(path), manifest)
+    clear_logs()
@@ -0,0 +1,103 @@
+from puppet_tools.constants import LOG_TYPE_ERROR
+from puppet_tools.main import process_file
+from puppet_tools.summary import summarize
+from puppet_tools.utility import clear_logs, get_logs
+from puppet_tools.validate import verify_duplicate_resources
+
+
+def duplicate_errors(content):
+    clear_logs()
+    resources = summarize(process_file("init.pp", content)).resources
+    clear_logs()
+    errors = verify_duplicate_resources(resources)
+    logs = [log for log in get_logs() if log[1] == LOG_TYPE_ERROR]
+    clear_logs()
+    return errors, logs
+
+
+def test_if_else_branches_are_exclusive():
+    errors, logs = duplicate_errors("""class app {
+  if $facts['os']['family'] == 'Debian' {
+    package { 'apache2':
+      ensure => present,
+    }
+  } elsif $facts['os']['family'] == 'Suse' {
+    package { 'apache2':
+      ensure => present,
+    }
+  } else {
+    package { 'apache2':
+      ensure => present,
+    }
+  }
+}
+""")
+    assert not errors
+    assert logs == []
+
+
+def test_unless_branch_and_enclosing_block_are_not_exclusive():
+    errors, logs = duplicate_errors("""class app {
+  unless $facts['virtual'] == 'docker' {
+    package { 'apache2':
+      ensure => present,
+    }
+  }
+  package { 'apache2':
+    ensure => present,
+  }
+}
+""")
+    assert errors
+    assert len(logs) == 1
+    assert logs[0][2] == (7, 0)
+
+
+def test_separate_conditionals_are_not_exclusive():
+    errors, _ = duplicate_errors("""class app {
+  if $a {
+    package { 'apache2':
+      ensure => present,
+    }
+  }
+  if $b {
+    package { 'apache2':
+      ensure => present,
+    }
+  }
+}
+""")
+    assert errors
+
+
+def test_nested_case_items():
+    errors, logs = duplicate_errors("""class app {
+  case $a {
+    'x': {
+      package { 'apache2':
+        ensure => present,
+      }
+    }
+    'y': {
+      case $b {
+        'one': {
+          package { 'apache2':
+            ensure => present,
+          }
+        }
+        'two': {
+          package { 'apache2':
+            ensure => present,
+          }
+        }
+      }
+      package { 'apache2':
+        ensure => present,
+      }
+    }
+  }
+}
+""")
+    assert errors
+    assert [log[2] for log in logs] == [(21, 0)]
+    assert "(init.pp:11)" in logs[0][3]
@@ -0,0 +1,22 @@
+from puppet_tools.exports import build_exports
+from puppet_tools.main import process_file
+from puppet_tools.summary import summarize
+from puppet_tools.utility import clear_logs
+
+
+def test_only_defined_classes_are_exported():
+    clear_logs()
+    summary = summarize(process_file("init.pp", """class base {
+  class { 'ntp':
+    servers => ['pool.ntp.org'],
+  }
+  include apt
+}
+class base::config {
+}
+class helper {
+}
+"""))
+    clear_logs()
+    assert [s.name for s in summary.includes] == ["ntp", "apt"]
+    assert build_exports([summary], "base").classes == {"base", "base::config"}
@@ -0,0 +1,37 @@
+import sqlite3
+
+from puppet_tools.inventory import export_inventory
+from puppet_tools.main import process_file
+from puppet_tools.summary import summarize
+from puppet_tools.utility import clear_logs
+
+
+def test_chains_are_exported_as_refs(tmp_path):
+    clear_logs()
+    summary = summarize(process_file(str(tmp_path / "manifests" / "init.pp"), """class app {
+  package { 'nginx':
+    ensure => present,
+  }
+  service { 'nginx':
+    ensure  => running,
+    require => Package['nginx'],
+  }
+  Package['nginx'] -> File['/etc/nginx.conf'] ~> Service['nginx']
+}
+"""))
+    clear_logs()
+    database = str(tmp_path / "inventory.db")
+    assert export_inventory(database, str(tmp_path), [summary]) == 1
+
+    connection = sqlite3.connect(database)
+    rows = connection.execute("SELECT objects.kind, objects.name, refs.parameter FROM refs "
+                              "JOIN objects ON objects.id = refs.object_id "
+                              "WHERE refs.type = 'package' AND refs.title = 'nginx' ORDER BY objects.kind").fetchall()
+    assert rows == [("chain", "Package['nginx'] -> File['/etc/nginx.conf'] -> Service['nginx']", "step 0"),
+                    ("resource", "nginx", "require")]
+    steps = connection.execute("SELECT refs.parameter, refs.type, refs.title FROM refs "
+                               "JOIN objects ON objects.id = refs.object_id "
+                               "WHERE objects.kind = 'chain' ORDER BY refs.parameter").fetchall()
+    assert steps == [("step 0", "package", "nginx"), ("step 1", "file", "/etc/nginx.conf"),
+                     ("step 2", "service", "nginx")]
+    connection.close()
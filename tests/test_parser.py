@@ -0,0 +1,102 @@
+import pytest
+
+from puppet_tools import parser
+from puppet_tools.constants import LOG_TYPE_ERROR, LOG_TYPE_FATAL
+from puppet_tools.main import process_file
+from puppet_tools.puppet_objects.puppet_class import PuppetClass
+from puppet_tools.puppet_objects.puppet_include import PuppetInclude
+from puppet_tools.puppet_objects.puppet_resource import PuppetResource
+from puppet_tools.puppet_objects.puppet_variable import PuppetVariable
+from puppet_tools.utility import clear_logs, get_logs
+
+
+def parse(content):
+    clear_logs()
+    puppet_file = process_file("init.pp", content)
+    logs = list(get_logs())
+    clear_logs()
+    return puppet_file, logs
+
+
+def find_items(item, kind):
+    found = []
+    stack = [item]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, kind):
+            found.append(item)
+        stack.extend(reversed(getattr(item, "items", None) or []))
+    return found
+
+
+def test_line_numbers_across_nested_blocks():
+    puppet_file, logs = parse("""class app {
+  # comment
+  $ensure = present
+
+  class app::inner {
+    case $facts['os']['family'] {
+      'Debian': {
+        package { 'apt':
+          ensure => $ensure,
+        }
+      }
+      'RedHat': {
+        if $facts['virtual'] == 'docker' {
+          package { 'docker':
+            ensure => $ensure,
+          }
+        } else {
+          include app::vm
+        }
+      }
+    }
+  }
+  file { '/etc/app.conf':
+    ensure => file,
+  }
+  Package['apt'] -> File['/etc/app.conf']
+  service { 'app':
+    ensure => running,
+  }
+}
+""")
+    assert [log for log in logs if log[1] >= LOG_TYPE_ERROR] == []
+    assert [(c.name, c.line_number) for c in find_items(puppet_file, PuppetClass)] == [("app", 1),
+                                                                                       ("app::inner", 5)]
+    assert [(v.name, v.line_number) for v in find_items(puppet_file, PuppetVariable)] == [("ensure", 3)]
+    assert [(r.name, r.line_number) for r in find_items(puppet_file, PuppetResource)] == [
+        ("apt", 8), ("docker", 14), ("/etc/app.conf", 23), ("app", 27)]
+    assert [(i.name, i.line_number) for i in find_items(puppet_file, PuppetInclude)] == [("app::vm", 18)]
+
+
+def test_include_name_without_newline():
+    puppet_file, _ = parse("class app {\n  include app::config\n  include app::service\n}\n")
+    assert [i.name for i in find_items(puppet_file, PuppetInclude)] == ["app::config", "app::service"]
+
+
+def test_class_declaration_name():
+    puppet_file, _ = parse("class app {\n  class { 'app::config':\n    port => 80,\n  }\n}\n")
+    declaration = find_items(puppet_file, PuppetClass)[1]
+    assert (declaration.name, declaration.is_declaration, declaration.line_number) == ("app::config", True, 2)
+
+
+def test_single_line_resource():
+    puppet_file, logs = parse("class app {\n  package { 'nginx': ensure => present }\n  include app::config\n}\n")
+    assert [log for log in logs if log[1] == LOG_TYPE_FATAL] == []
+    assert [(r.name, r.line_number) for r in find_items(puppet_file, PuppetResource)] == [("nginx", 2)]
+    assert [(i.name, i.line_number) for i in find_items(puppet_file, PuppetInclude)] == [("app::config", 3)]
+
+
+@pytest.mark.parametrize("depth, fatal", [(4, False), (5, True)])
+def test_max_depth(monkeypatch, depth, fatal):
+    monkeypatch.setattr(parser, "max_depth", 5)
+    content = "".join("class c%d {\n" % i for i in range(depth)) + "}\n" * depth
+    puppet_file, logs = parse(content)
+    fatal_logs = [log for log in logs if log[1] == LOG_TYPE_FATAL]
+    if fatal:
+        assert [log[3] for log in fatal_logs] == ["Maximum nesting depth of 5 exceeded at line 5, file can't be parsed"]
+        assert puppet_file.items == []
+    else:
+        assert fatal_logs == []
+        assert len(find_items(puppet_file, PuppetClass)) == depth
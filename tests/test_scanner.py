@@ -0,0 +1,73 @@
+import random
+
+import pytest
+
+from puppet_tools import scanner
+from puppet_tools.constants import LOG_TYPE_ERROR
+from puppet_tools.main import process_file
+from puppet_tools.utility import clear_logs, get_logs
+
+MANIFEST = """class app {
+  $ensure = present
+  package { 'nginx':
+    ensure => $ensure,
+  }
+  include app::config
+}
+"""
+
+
+def parse_file(path):
+    clear_logs()
+    puppet_file = process_file(str(path))
+    logs = list(get_logs())
+    clear_logs()
+    return puppet_file, logs
+
+
+def test_crlf_line_endings_parse_like_lf(tmp_path):
+    lf = tmp_path / "lf.pp"
+    crlf = tmp_path / "crlf.pp"
+    lf.write_bytes(MANIFEST.encode())
+    crlf.write_bytes(MANIFEST.replace("\n", "\r\n").encode())
+
+    lf_file, lf_logs = parse_file(lf)
+    crlf_file, crlf_logs = parse_file(crlf)
+    assert [log for log in crlf_logs if log[1] >= LOG_TYPE_ERROR] == []
+    assert [log[1:] for log in crlf_logs] == [log[1:] for log in lf_logs]
+
+    resource = crlf_file.items[0].items[0].items[0].items[1]
+    assert resource.items == ["ensure => $ensure,"]
+    assert repr(crlf_file.items) == repr(lf_file.items)
+
+
+ALPHABET = ["{", "}", "'", '"', "#", "\\", "\n", "a", " ", "é", "\\'", '\\"', "\\\\", "'a'", "# {\n", "€"]
+
+
+def random_manifests(seed, count=1000, ascii_only=False):
+    rng = random.Random(seed)
+    alphabet = [c for c in ALPHABET if all(ord(char) < 128 for char in c)] if ascii_only else ALPHABET
+    for _ in range(count):
+        yield "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 120)))
+
+
+@pytest.mark.skipif(scanner.numpy is None, reason="NumPy is not installed")
+@pytest.mark.parametrize("chunks", [(scanner.SCAN_CHUNK, scanner.PATH_CHUNK), (7, 5)])
+def test_numpy_prescan_matches_python_prescan(monkeypatch, chunks):
+    # Small chunks take the paths across the chunk boundaries as well
+    monkeypatch.setattr(scanner, "SCAN_CHUNK", chunks[0])
+    monkeypatch.setattr(scanner, "PATH_CHUNK", chunks[1])
+    for content in random_manifests(1):
+        assert scanner.scan_structure_numpy(scanner.get_codes(content)) == scanner.scan_structure(content), content
+    for content in random_manifests(2, ascii_only=True):
+        buffer = content.encode("ascii")
+        assert scanner.scan_structure_numpy(scanner.get_codes(buffer)) == \
+            scanner.scan_structure(buffer, scanner.STRUCTURE_BYTES), content
+
+
+@pytest.mark.skipif(scanner.numpy is None, reason="NumPy is not installed")
+def test_get_codes():
+    assert scanner.get_codes("a{").tolist() == [97, 123]
+    assert scanner.get_codes("a{").dtype == scanner.numpy.uint8
+    assert scanner.get_codes("é{€").tolist() == [233, 123, 8364]
+    assert scanner.get_codes(b"a{").tolist() == [97, 123]
@@ -0,0 +1,91 @@
+import json
+import os
+
+from puppet_tools import templates
+from puppet_tools.constants import LOG_TYPE_ERROR, LOG_TYPE_INFO
+from puppet_tools.main import process_file
+from puppet_tools.rules import RuleContext
+from puppet_tools.summary import summarize
+from puppet_tools.utility import clear_logs, get_logs
+from puppet_tools.validate import TemplatesRule
+
+
+def check_templates(module_dir, content, log_type=LOG_TYPE_ERROR):
+    clear_logs()
+    summary = summarize(process_file("init.pp", content))
+    clear_logs()
+    rule = TemplatesRule(RuleContext(str(module_dir), "app"))
+    for resource in summary.resources:
+        rule.visit("resource", resource)
+    for variable in summary.variables:
+        rule.visit("variable", variable)
+    for call in summary.template_calls:
+        rule.visit("template_call", call)
+    errors = rule.finish()
+    logs = [log for log in get_logs() if log[1] == log_type]
+    clear_logs()
+    return errors, logs
+
+
+def test_template_call_in_variable(tmp_path):
+    errors, logs = check_templates(tmp_path, """class app {
+  $cfg = epp('app/missing.epp', {})
+  file { '/etc/app.conf':
+    content => $cfg,
+  }
+}
+""")
+    assert errors
+    assert [log[2] for log in logs] == [(2, 0)]
+
+
+def test_scan_cache_is_persisted(tmp_path, monkeypatch):
+    module_dir = tmp_path / "app"
+    cache_dir = tmp_path / "cache"
+    (module_dir / "templates").mkdir(parents=True)
+    template = module_dir / "templates" / "app.conf.erb"
+    template.write_text("port = <%= @port %>\n")
+    content = "class app {\n  $port = 80\n  $cfg = template('app/app.conf.erb')\n}\n"
+
+    # Without a cache directory nothing is written
+    monkeypatch.setattr(templates, "scan_cache", {})
+    assert check_templates(module_dir, content) == (False, [])
+    assert os.listdir(str(module_dir)) == ["templates"]
+
+    monkeypatch.setattr(templates, "cache_dir", str(cache_dir))
+    monkeypatch.setattr(templates, "scan_cache", {})
+    assert check_templates(module_dir, content) == (False, [])
+
+    # A new process starts with an empty cache and takes the results of the first run from the file
+    cache_file = cache_dir / templates.TEMPLATE_CACHE_FILE
+    data = json.loads(cache_file.read_text())
+    data["templates"][str(template)][2] = 2
+    cache_file.write_text(json.dumps(data))
+    monkeypatch.setattr(templates, "scan_cache", {})
+    errors, logs = check_templates(module_dir, content)
+    assert errors
+    assert "2 unbalanced" in logs[0][3]
+
+    # A change of size with the same modification time scans the template again
+    stat = os.stat(str(template))
+    template.write_text("port = <%= @port %> <%= @port %>\n")
+    os.utime(str(template), ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    monkeypatch.setattr(templates, "scan_cache", {})
+    assert check_templates(module_dir, content) == (False, [])
+
+
+def test_epp_variables(tmp_path):
+    (tmp_path / "templates").mkdir()
+    (tmp_path / "templates" / "app.conf.epp").write_text("""<%- | Integer $port | -%>
+listen <%= $port %> <%= $app::bind %> <%= $facts['fqdn'] %>
+<% $servers.each |$server| { -%>
+server <%= $server %>
+<% } -%>
+""")
+    _, logs = check_templates(tmp_path, """class app {
+  $bind = '0.0.0.0'
+  $cfg = epp('app/app.conf.epp', { 'port' => 80 })
+}
+""", LOG_TYPE_INFO)
+    assert [log[3] for log in logs] == ["Template 'app/app.conf.epp' uses '$servers' which is not assigned in the "
+                                        "module, may be a class parameter or fact"]